@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+import requests
+from .http_client import KEYCLOAK_UPSTREAM
+
+logger = logging.getLogger(__name__)
+
+
+class AdminTokenManager:
+    """Process-wide holder for the Keycloak master realm admin token.
+
+    The cached access token is handed out until ``expiry_margin`` seconds
+    before it expires. Renewal uses the refresh_token grant while the refresh
+    token is still valid and falls back to a full password grant otherwise.
+    Only one thread renews at a time; threads that arrive while a renewal is
+    in flight wait for it and reuse its result.
+    """
+
+    def __init__(
+        self, http, token_url, client_id, username, password, expiry_margin=30
+    ):
+        self.http = http
+        self.token_url = token_url
+        self.client_id = client_id
+        self.username = username
+        self.password = password
+        self.expiry_margin = expiry_margin
+        self._access_token = None
+        self._access_expires_at = 0.0
+        self._refresh_token = None
+        self._refresh_expires_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.password_grants = 0
+        self.failures = 0
+
+    def get_token(self):
+        token = self._current_token()
+        if token:
+            self.hits += 1
+            return token
+
+        with self._refresh_lock:
+            # Another thread may have renewed the token while we were waiting.
+            token = self._current_token()
+            if token:
+                self.hits += 1
+                return token
+            self.misses += 1
+            return self._renew()
+
+    def invalidate(self):
+        with self._refresh_lock:
+            self._access_token = None
+            self._access_expires_at = 0.0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "password_grants": self.password_grants,
+            "failures": self.failures,
+        }
+
+    def _current_token(self):
+        if self._access_token and time.monotonic() < self._access_expires_at:
+            return self._access_token
+        return None
+
+    def _renew(self):
+        if self._refresh_token and time.monotonic() < self._refresh_expires_at:
+            token_data = self._request_token(
+                {
+                    "client_id": self.client_id,
+                    "grant_type": "refresh_token",
+                    "refresh_token": self._refresh_token,
+                }
+            )
+            if token_data:
+                self.refreshes += 1
+                return self._store(token_data)
+
+        token_data = self._request_token(
+            {
+                "client_id": self.client_id,
+                "username": self.username,
+                "password": self.password,
+                "grant_type": "password",
+            }
+        )
+        if token_data:
+            self.password_grants += 1
+            return self._store(token_data)
+
+        self.failures += 1
+        return None
+
+    def _request_token(self, data):
+        try:
+            response = self.http.request(
+                KEYCLOAK_UPSTREAM, "POST", self.token_url, data=data
+            )
+            if response.status_code == 200:
+                return response.json()
+            logger.error(
+                "Admin token request (%s) failed: %s",
+                data["grant_type"],
+                response.status_code,
+            )
+        except requests.exceptions.RequestException as e:
+            logger.error("Admin token request (%s) failed: %s", data["grant_type"], e)
+        return None
+
+    def _store(self, token_data):
+        now = time.monotonic()
+        self._access_token = token_data.get("access_token")
+        self._access_expires_at = (
+            now + token_data.get("expires_in", 60) - self.expiry_margin
+        )
+        self._refresh_token = token_data.get("refresh_token")
+        self._refresh_expires_at = (
+            now + token_data.get("refresh_expires_in", 0) - self.expiry_margin
+        )
+        return self._access_token
@@ -1,14 +1,62 @@
+import functools
 import logging
 import sys
 import os
-from flask import Flask, session
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import (
+    Flask,
+    session,
+    request,
+    g,
+    before_render_template,
+    template_rendered,
+)
 from datetime import timedelta
-from .config import Config
-from .routes_utils import get_user_roles
+from .config import Config, parse_pairs
+from .routes_utils import (
+    load_user_roles,
+    fetch_client_id,
+    fetch_pending_items,
+    revalidated_etag,
+    ADMIN_CLIENT_CLI_ID,
+    ISTIO_CLIENT_ID,
+)
+from .admin_token import AdminTokenManager
+from .assets import init_assets
+from .async_http import AsyncUpstreamClient
+from .http_client import UpstreamHttpClient, BOOKS_UPSTREAM, KEYCLOAK_UPSTREAM
+from .client_registry import ClientIdRegistry
+from .compression import CompressedBodyCache, ResponseCompressor, available_codecs
+from .json_provider import FastJSONProvider
+from .jwt_verifier import JwksCache, TokenVerifier
+from .logging_config import (
+    JsonFormatter,
+    PayloadFilter,
+    payload_logger,
+    queue_stats,
+    start_queue_logging,
+)
+from .metrics import MetricsRegistry, UpstreamMetrics
+from .pending_feed import PendingFeed
+from . import tracing
+from .resilience import CircuitBreaker, RetryBudget, UpstreamGuard
+from .response_cache import ResponseCache, LruCacheBackend, RedisCacheBackend
+from .role_cache import RoleCache
+from .single_flight import SingleFlight
+from .template_cache import FragmentCacheExtension, RenderCache
+from .session_store import (
+    CookieSessionInterface,
+    MemorySessionStore,
+    RedisSessionStore,
+    ServerSideSessionInterface,
+)
 from .auth_routes import auth_bp
 from .books_info_routes import books_info_bp
 from .requests_routes import requests_bp
 
+logger = logging.getLogger(__name__)
+
 __all__ = ["create_app"]
 
 
@@ -23,22 +71,377 @@ def create_app():
     )
     configure_logging()
     configure_app(app)
+    configure_extensions(app)
+    # Its after_request hook is registered first so it runs last, on the
+    # final body, after ETags and conditional handling.
+    configure_compression(app)
+    configure_templates(app)
+    configure_metrics(app)
+    configure_tracing(app)
     configure_blueprints(app)
 
     app.permanent_session_lifetime = timedelta(seconds=1800)
 
     @app.before_request
     def update_session_timeout():
-        session.permanent = True
+        # Static responses leave the session alone; see is_static_request().
+        if request.endpoint != "static":
+            session.permanent = True
+
+    @app.after_request
+    def add_conditional_etag(response):
+        if (
+            request.method == "GET"
+            and response.status_code == 200
+            and response.mimetype == "application/json"
+            and not response.is_streamed
+        ):
+            if not response.get_etag()[0]:
+                response.add_etag()
+            # A client holding the compressed body sends its encoded ETag.
+            matched = revalidated_etag(response.get_etag()[0])
+            if matched:
+                response.set_etag(matched)
+            response.make_conditional(request)
+        return response
 
-    logging.info("Flask Webserver started")
+    logger.info("Flask Webserver started")
 
     return app
 
 
 def configure_app(app: Flask):
     app.config.from_object(Config)
-    app.config["SESSION_TYPE"] = "filesystem"
+    app.json = FastJSONProvider(app)
+    configure_sessions(app)
+    init_assets(app)
+
+
+def configure_sessions(app: Flask):
+    if app.config["SESSION_TYPE"] == "redis":
+        store = RedisSessionStore(app.config["SESSION_REDIS_URL"])
+    elif app.config["SESSION_TYPE"] == "memory":
+        store = MemorySessionStore(app.config["SESSION_MAX_ENTRIES"])
+    else:
+        # "cookie" keeps Flask's signed cookie sessions.
+        app.session_interface = CookieSessionInterface()
+        return
+    app.session_interface = ServerSideSessionInterface(store)
+
+
+def create_upstream_guard(app: Flask, name):
+    return UpstreamGuard(
+        CircuitBreaker(
+            name,
+            failure_threshold=app.config["UPSTREAM_BREAKER_FAILURE_THRESHOLD"],
+            reset_timeout=app.config["UPSTREAM_BREAKER_RESET_TIMEOUT"],
+        ),
+        RetryBudget(
+            ratio=app.config["UPSTREAM_RETRY_BUDGET_RATIO"],
+            min_per_second=app.config["UPSTREAM_RETRY_BUDGET_MIN_PER_SECOND"],
+        ),
+        max_retries=app.config["UPSTREAM_GET_RETRIES"],
+        backoff_base=app.config["UPSTREAM_RETRY_BACKOFF_BASE"],
+        backoff_cap=app.config["UPSTREAM_RETRY_BACKOFF_CAP"],
+    )
+
+
+def register_upstreams(app: Flask, client, guards):
+    client.register(
+        BOOKS_UPSTREAM,
+        pool_size=app.config["BOOKS_SERVICE_POOL_SIZE"],
+        timeout=app.config["BOOKS_SERVICE_TIMEOUT"],
+        connect_retries=app.config["UPSTREAM_CONNECT_RETRIES"],
+        guard=guards[BOOKS_UPSTREAM],
+    )
+    client.register(
+        KEYCLOAK_UPSTREAM,
+        pool_size=app.config["KEYCLOAK_POOL_SIZE"],
+        timeout=app.config["KEYCLOAK_TIMEOUT"],
+        connect_retries=app.config["UPSTREAM_CONNECT_RETRIES"],
+        verify=app.config["KEYCLOAK_VERIFY_TLS"],
+        guard=guards[KEYCLOAK_UPSTREAM],
+    )
+    return client
+
+
+def configure_extensions(app: Flask):
+    metrics = MetricsRegistry()
+    app.extensions["metrics"] = metrics
+    upstream_metrics = UpstreamMetrics(metrics)
+    # Guards are shared by the sync and async clients: one view of upstream health.
+    guards = {
+        name: create_upstream_guard(app, name)
+        for name in (BOOKS_UPSTREAM, KEYCLOAK_UPSTREAM)
+    }
+    app.extensions["upstream_guards"] = guards
+    http_client = register_upstreams(app, UpstreamHttpClient(upstream_metrics), guards)
+    app.extensions["http_client"] = http_client
+    if app.config["UPSTREAM_COALESCING_ENABLED"]:
+        app.extensions["single_flight"] = SingleFlight()
+    app.extensions["fanout_executor"] = ThreadPoolExecutor(
+        max_workers=app.config["FANOUT_MAX_WORKERS"], thread_name_prefix="fanout"
+    )
+    if app.config["ASYNC_MODE"]:
+        app.extensions["async_http_client"] = register_upstreams(
+            app, AsyncUpstreamClient(upstream_metrics), guards
+        )
+    app.extensions["admin_token"] = AdminTokenManager(
+        http_client,
+        app.config["KEYCLOAK_REALM_MASTER_OPENID_TOKEN_URL"],
+        ADMIN_CLIENT_CLI_ID,
+        app.config["KEYCLOAK_ADMIN_USERNAME"],
+        app.config["KEYCLOAK_ADMIN_PASSWORD"],
+        expiry_margin=app.config["ADMIN_TOKEN_EXPIRY_MARGIN"],
+    )
+    app.extensions["client_registry"] = ClientIdRegistry(fetch_client_id)
+    if app.config["JWT_LOCAL_VERIFICATION"]:
+        app.extensions["token_verifier"] = TokenVerifier(
+            JwksCache(
+                http_client,
+                app.config["JWKS_URL"],
+                lifespan=app.config["JWKS_LIFESPAN"],
+                min_refetch_interval=app.config["JWKS_MIN_REFETCH_INTERVAL"],
+            ),
+            issuer=app.config["JWT_ISSUER"],
+            client_id=ISTIO_CLIENT_ID,
+            audience=app.config["JWT_AUDIENCE"] or None,
+            leeway=app.config["JWT_LEEWAY"],
+        )
+    configure_response_cache(app)
+    app.extensions["role_cache"] = RoleCache(
+        app,
+        load_user_roles,
+        ttl=app.config["ROLE_CACHE_TTL"],
+        stale_ttl=app.config["ROLE_CACHE_STALE_TTL"],
+        max_entries=app.config["ROLE_CACHE_MAX_ENTRIES"],
+    )
+    app.extensions["pending_feed"] = PendingFeed(
+        functools.partial(fetch_pending_items, app),
+        {"books": "bookId", "reviews": "reviewId"},
+        interval=app.config["PENDING_FEED_INTERVAL"],
+        max_subscribers=app.config["STREAM_MAX_SUBSCRIBERS"],
+    )
+
+
+def configure_metrics(app: Flask):
+    metrics = app.extensions["metrics"]
+    request_latency = metrics.histogram(
+        "http_request_duration_seconds",
+        "Latency of handled requests by method, endpoint and status.",
+        ("method", "endpoint", "status"),
+    )
+    requests_in_flight = metrics.gauge(
+        "http_requests_in_flight", "Requests currently being handled."
+    )
+
+    metrics.register_stats(
+        "upstream_pool",
+        "Upstream connection pools.",
+        app.extensions["http_client"].stats,
+    )
+    for name, guard in app.extensions["upstream_guards"].items():
+        metrics.register_stats(
+            f"upstream_{name}", f"Circuit breaker and retries for {name}.", guard.stats
+        )
+    if "single_flight" in app.extensions:
+        metrics.register_stats(
+            "upstream_coalescing",
+            "Coalesced upstream GETs.",
+            app.extensions["single_flight"].stats,
+        )
+    metrics.register_stats(
+        "admin_token",
+        "Keycloak admin token manager.",
+        app.extensions["admin_token"].stats,
+    )
+    metrics.register_stats(
+        "role_cache", "Role cache.", app.extensions["role_cache"].stats
+    )
+    if "response_cache" in app.extensions:
+        metrics.register_stats(
+            "response_cache",
+            "Upstream response cache.",
+            app.extensions["response_cache"].stats,
+        )
+    if isinstance(app.session_interface, ServerSideSessionInterface) and isinstance(
+        app.session_interface.store, MemorySessionStore
+    ):
+        store = app.session_interface.store
+        metrics.register_stats(
+            "session_store", "In-process session store.", lambda: {"size": store.size()}
+        )
+    if "render_cache" in app.extensions:
+        metrics.register_stats(
+            "render_cache",
+            "Rendered pages and template fragments.",
+            app.extensions["render_cache"].stats,
+        )
+    if "compressor" in app.extensions:
+        metrics.register_stats(
+            "compression",
+            "Response compression.",
+            app.extensions["compressor"].stats,
+        )
+    metrics.register_stats(
+        "pending_feed",
+        "Pending moderation stream.",
+        app.extensions["pending_feed"].stats,
+    )
+    metrics.register_stats("log_queue", "Queued log pipeline.", queue_stats)
+
+    # Registered before the other hooks, so the timer wraps them and the
+    # recorded status is the one actually sent.
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        requests_in_flight.inc()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get("request_started")
+        if started is not None:
+            request_latency.observe(
+                time.perf_counter() - started,
+                request.method,
+                request.endpoint or "unmatched",
+                str(response.status_code),
+            )
+        return response
+
+    @app.teardown_request
+    def finish_request_timer(exc):
+        if g.pop("request_started", None) is not None:
+            requests_in_flight.dec()
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics_endpoint():
+        return app.response_class(
+            metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+
+def configure_tracing(app: Flask):
+    if not app.config["TRACING_ENABLED"]:
+        return
+
+    exporter = None
+    if app.config["TRACE_EXPORTER"] == "stdout":
+        exporter = tracing.BatchSpanExporter(tracing.StdoutSpanExporter())
+    elif app.config["TRACE_EXPORTER"] == "file":
+        exporter = tracing.BatchSpanExporter(
+            tracing.FileSpanExporter(app.config["TRACE_FILE_PATH"])
+        )
+    elif app.config["TRACE_EXPORTER"] == "otlp":
+        exporter = tracing.BatchSpanExporter(
+            tracing.OtlpHttpSpanExporter(
+                app.config["TRACE_OTLP_ENDPOINT"], app.config["PROJECT_NAME"]
+            )
+        )
+    if exporter is not None:
+        app.extensions["metrics"].register_stats(
+            "span_exporter", "Span export queue.", exporter.stats
+        )
+    tracer = tracing.Tracer(exporter, app.config["TRACE_SAMPLE_RATE"])
+    app.extensions["tracer"] = tracer
+
+    @app.before_request
+    def start_trace():
+        g.trace_root, g.trace_token = tracer.start(
+            f"{request.method} {request.path}",
+            request.headers.get("traceparent"),
+            method=request.method,
+            path=request.path,
+        )
+
+    @app.after_request
+    def add_server_timing(response):
+        root = g.get("trace_root")
+        if root is not None:
+            root.name = f"{request.method} {request.endpoint or 'unmatched'}"
+            root.set("status", response.status_code)
+            if app.config["SERVER_TIMING_ENABLED"]:
+                response.headers["Server-Timing"] = tracing.server_timing(root)
+        return response
+
+    @app.teardown_request
+    def finish_trace(exc):
+        root = g.pop("trace_root", None)
+        if root is not None:
+            tracer.finish(root, g.pop("trace_token"))
+
+    def start_render_span(sender, template, context, **extra):
+        render_span = tracing.span("render", desc=template.name)
+        render_span.__enter__()
+        g.setdefault("render_spans", []).append(render_span)
+
+    def finish_render_span(sender, template, context, **extra):
+        render_spans = g.get("render_spans")
+        if render_spans:
+            render_spans.pop().__exit__(None, None, None)
+
+    # The handlers are local functions, so the signals must hold them strongly.
+    before_render_template.connect(start_render_span, app, weak=False)
+    template_rendered.connect(finish_render_span, app, weak=False)
+
+
+def configure_response_cache(app: Flask):
+    if not app.config["RESPONSE_CACHE_ENABLED"]:
+        return
+
+    if app.config["RESPONSE_CACHE_BACKEND"] == "redis":
+        backend = RedisCacheBackend(app.config["RESPONSE_CACHE_REDIS_URL"])
+    else:
+        backend = LruCacheBackend(app.config["RESPONSE_CACHE_MAX_ENTRIES"])
+
+    ttls = parse_pairs("RESPONSE_CACHE_TTLS", app.config["RESPONSE_CACHE_TTLS"], int)
+    app.extensions["response_cache"] = ResponseCache(
+        app, backend, ttls, stale_ttl=app.config["RESPONSE_CACHE_STALE_TTL"]
+    )
+
+
+def configure_compression(app: Flask):
+    if not app.config["COMPRESSION_ENABLED"]:
+        return
+
+    codecs = available_codecs()
+    preference = [
+        name.strip() for name in app.config["COMPRESSION_ENCODINGS"].split(",")
+    ]
+    compressor = ResponseCompressor(
+        codecs,
+        preference,
+        [
+            mimetype.strip()
+            for mimetype in app.config["COMPRESSION_MIMETYPES"].split(",")
+            if mimetype.strip()
+        ],
+        min_size=app.config["COMPRESSION_MIN_SIZE"],
+        levels=parse_pairs("COMPRESSION_LEVELS", app.config["COMPRESSION_LEVELS"], int),
+        streaming_levels=parse_pairs(
+            "COMPRESSION_STREAMING_LEVELS",
+            app.config["COMPRESSION_STREAMING_LEVELS"],
+            int,
+        ),
+        body_cache=CompressedBodyCache(app.config["COMPRESSION_CACHE_MAX_BYTES"]),
+    )
+    logger.info("Response compression: %s", ", ".join(compressor.encodings))
+    app.extensions["compressor"] = compressor
+    app.after_request(compressor)
+
+
+def configure_templates(app: Flask):
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    # Compile every template now rather than on the first request for each.
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    # Rendered markup would outlive template edits picked up by auto-reload.
+    if not app.config["TEMPLATE_CACHE_ENABLED"] or app.jinja_env.auto_reload:
+        return
+    cache = RenderCache(app.config["TEMPLATE_CACHE_MAX_CHARS"])
+    app.jinja_env.render_cache = cache
+    app.extensions["render_cache"] = cache
 
 
 def configure_blueprints(app: Flask):
@@ -49,17 +452,30 @@ def configure_blueprints(app: Flask):
 
 def configure_logging():
     log_handler = logging.StreamHandler(sys.stdout)
-    formatter = logging.Formatter(
-        "%(asctime)s %(levelname)-8s %(filename)s %(funcName)s %(lineno)d  %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
+    if Config.LOG_FORMAT == "json":
+        formatter = JsonFormatter(datefmt="%Y-%m-%dT%H:%M:%S%z")
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s %(levelname)-8s %(filename)s %(funcName)s %(lineno)d  %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
 
     log_handler.setFormatter(formatter)
     log_handler.setLevel(logging.DEBUG)
 
+    # Records are queued by the calling thread and written by a listener
+    # thread, so stdout never blocks a request.
     root_logger = logging.getLogger()
     root_logger.handlers.clear()
-    root_logger.setLevel(logging.DEBUG)
-    root_logger.addHandler(log_handler)
+    root_logger.setLevel(Config.LOG_LEVEL.upper())
+    root_logger.addHandler(start_queue_logging(log_handler, Config.LOG_QUEUE_SIZE))
+
+    for name, level in parse_pairs("LOG_LEVELS", Config.LOG_LEVELS, str.upper).items():
+        logging.getLogger(name).setLevel(level)
+
+    payload_logger.filters.clear()
+    payload_logger.addFilter(
+        PayloadFilter(Config.LOG_PAYLOAD_SAMPLE_RATE, Config.LOG_PAYLOAD_MAX_CHARS)
+    )
 
-    logging.info("Logging configured")
+    logger.info("Logging configured")
@@ -0,0 +1,76 @@
+import json
+import logging
+import mimetypes
+import os
+from flask import current_app, request, send_from_directory
+from .compression import negotiate_encoding
+
+logger = logging.getLogger(__name__)
+
+BUILD_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+# Content-Encoding -> file suffix, in order of preference on equal quality.
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+class AssetManifest:
+    """Static files fingerprinted and precompressed by ``build_assets.py``.
+
+    ``url_for("static", filename=...)`` is rewritten to the fingerprinted
+    name, which changes whenever the content does, so those files can be
+    cached forever. Without a manifest (e.g. a checkout that was never
+    built) every static file is served as is.
+    """
+
+    def __init__(self, static_dir):
+        self.static_dir = static_dir
+        self.files = {}
+        path = os.path.join(static_dir, BUILD_DIR, MANIFEST_NAME)
+        try:
+            with open(path) as file:
+                self.files = json.load(file)["files"]
+        except FileNotFoundError:
+            logger.info("No asset manifest at %s, serving unbuilt assets", path)
+        self.built = {entry["path"]: entry for entry in self.files.values()}
+
+    def fingerprinted(self, filename):
+        entry = self.files.get(filename)
+        return entry["path"] if entry else filename
+
+    def lookup(self, filename):
+        return self.built.get(filename)
+
+
+def serve_static(filename):
+    manifest = current_app.extensions["assets"]
+    entry = manifest.lookup(filename)
+    if entry is None:
+        return current_app.send_static_file(filename)
+
+    encoding = negotiate_encoding(
+        request.accept_encodings,
+        [name for name in ENCODINGS if name in entry["encodings"]],
+    )
+    response = send_from_directory(
+        manifest.static_dir,
+        filename + ENCODINGS[encoding] if encoding else filename,
+        mimetype=mimetypes.guess_type(filename)[0],
+        max_age=current_app.config["STATIC_ASSET_MAX_AGE"],
+    )
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app):
+    manifest = AssetManifest(app.static_folder)
+    app.extensions["assets"] = manifest
+    app.view_functions["static"] = serve_static
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == "static" and "filename" in values:
+            values["filename"] = manifest.fingerprinted(values["filename"])
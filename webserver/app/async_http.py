@@ -0,0 +1,126 @@
+import asyncio
+import threading
+from urllib.parse import urlsplit
+import httpx
+import requests
+from . import tracing
+
+
+class AsyncUpstreamClient:
+    """Non-blocking upstream client running on a dedicated event loop thread.
+
+    All upstream I/O is multiplexed on one loop, so a slow books service or
+    Keycloak only costs an idle socket per in-flight call instead of a blocked
+    worker thread. Synchronous code hands coroutines over with ``run`` or
+    ``submit``; async code can ``await`` ``request`` directly on ``loop``.
+
+    Transport errors are re-raised as ``requests`` exceptions so callers keep
+    a single error surface regardless of the execution mode.
+    """
+
+    def __init__(self, metrics=None):
+        self._upstreams = {}
+        self._guards = {}
+        self.metrics = metrics
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="upstream-loop", daemon=True
+        )
+        self._thread.start()
+
+    def register(
+        self, name, pool_size, timeout, connect_retries=0, verify=True, guard=None
+    ):
+        async def create_client():
+            return httpx.AsyncClient(
+                verify=verify,
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size,
+                ),
+                transport=httpx.AsyncHTTPTransport(
+                    verify=verify, retries=connect_retries
+                ),
+            )
+
+        self._upstreams[name] = self.run(create_client())
+        if guard is not None:
+            self._guards[name] = guard
+
+    async def request(self, name, method, url, retry=True, **kwargs):
+        """Send a request through the upstream's guard, if it has one.
+
+        ``retry=False`` turns off retries for GETs that are not idempotent.
+        """
+        guard = self._guards.get(name)
+        if guard is None:
+            return await self._send(name, method, url, **kwargs)
+
+        # The breaker sees one outcome per call, once retries are exhausted.
+        guard.acquire()
+        attempt = 0
+        recorded = False
+        try:
+            while True:
+                try:
+                    response = await self._send(name, method, url, **kwargs)
+                except requests.exceptions.RequestException as e:
+                    delay = guard.retry_delay(method, attempt) if retry else None
+                    if delay is None:
+                        recorded = True
+                        guard.record(error=e)
+                        raise
+                else:
+                    failed = guard.is_failure(status=response.status_code)
+                    delay = (
+                        guard.retry_delay(method, attempt) if failed and retry else None
+                    )
+                    if delay is None:
+                        recorded = True
+                        guard.record(status=response.status_code)
+                        return response
+                attempt += 1
+                await asyncio.sleep(delay)
+        except BaseException as e:
+            # Anything else (a bug, a cancelled task) still ends the call, and
+            # must not leave a half-open probe in flight forever.
+            if not recorded:
+                guard.record(error=e)
+            raise
+
+    async def _send(self, name, method, url, data=None, json=None, **kwargs):
+        client = self._upstreams[name]
+        with tracing.span(
+            name, "client", desc=f"{method} {urlsplit(url).path}", url=url
+        ) as span:
+            kwargs["headers"] = tracing.inject(kwargs.get("headers"))
+            started = self.metrics.start(name) if self.metrics is not None else None
+            try:
+                response = await client.request(
+                    method, url, data=data, json=json, **kwargs
+                )
+            except httpx.HTTPError as e:
+                if isinstance(e, httpx.TimeoutException):
+                    error = requests.exceptions.Timeout(str(e))
+                else:
+                    error = requests.exceptions.ConnectionError(str(e))
+                if started is not None:
+                    self.metrics.finish(name, method, started, error=error)
+                span.set("error", type(error).__name__)
+                raise error from e
+            if started is not None:
+                self.metrics.finish(name, method, started, status=response.status_code)
+            span.set("status", response.status_code)
+            return response
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        return self.submit(coro).result()
+
+    def close(self):
+        for client in self._upstreams.values():
+            self.run(client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
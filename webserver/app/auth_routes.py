@@ -6,22 +6,23 @@ from flask import (
     jsonify,
     redirect,
     url_for,
-    render_template,
 )
 import requests
 import logging
 from . import routes_utils as utils
 
+logger = logging.getLogger(__name__)
+
 auth_bp = Blueprint("auth", __name__)
 
 
 @auth_bp.route("/", methods=["GET"])
 def index():
     if session.get("Authorization"):
-        logging.info("User already logged in")
+        logger.info("User already logged in")
         return redirect(url_for("auth.dashboard"))
-    logging.info("User not logged in")
-    return render_template("index.html")
+    logger.info("User not logged in")
+    return utils.render_page("index.html")
 
 
 @auth_bp.route("/teapot", methods=["GET"])
@@ -42,37 +43,47 @@ def login():
         "scope:": "profile roles",
     }
     try:
-        response = requests.post(
+        response = utils.keycloak_request(
+            "POST",
             current_app.config["KEYCLOAK_REALM_ISTIO_OPENID_TOKEN_URL"],
             data=data,
-            verify=False,
-            timeout=1,
         )
-        logging.info("Keycloak response: %s", response.text)
+        logger.debug("Keycloak token response: %s", response.status_code)
 
         if response.status_code == 200:
             token_data = response.json()
             session["Authorization"] = token_data["access_token"]
             session["refresh_token"] = token_data["refresh_token"]
             session["username"] = username
-            admin_token = utils.get_admin_token()
-            user_id = utils.get_user_id(admin_token, username)
-            session["keycloak_user_id"] = user_id
-            client_id = utils.get_client_id(admin_token)
-            session["role"] = "-".join(
-                utils.get_user_roles(admin_token, user_id, client_id)
+            user_id, roles = utils.resolve_login_identity(
+                token_data["access_token"], username
             )
-            logging.info("Role: %s", session["role"])
+            session["keycloak_user_id"] = user_id
+            role_cache = current_app.extensions["role_cache"]
+            if roles is not None:
+                role_cache.put(user_id, roles)
+            else:
+                # Keycloak could not say; fall back to roles seen earlier.
+                roles = role_cache.peek(user_id)
+            if roles is None:
+                logger.error("Could not resolve roles for user %s", user_id)
+                session.clear()
+                return (
+                    jsonify({"success": False, "message": "Could not load user roles"}),
+                    502,
+                )
+            session["role"] = "-".join(roles)
+            logger.info("Role: %s", session["role"])
             return jsonify({"success": True, "redirect": url_for("auth.dashboard")})
         else:
-            logging.error("Invalid credentials")
+            logger.error("Invalid credentials")
             session.clear()
             return (
                 jsonify({"success": False, "message": "Invalid credentials"}),
                 401,
             )
     except requests.exceptions.RequestException:
-        logging.error("Invalid credentials")
+        logger.error("Invalid credentials")
         session.clear()
         return jsonify({"success": False, "message": "Invalid credentials"}), 401
 
@@ -81,11 +92,11 @@ def login():
 def dashboard():
     access_token = session.get("Authorization")
     if not access_token:
-        logging.error("User not logged in")
+        logger.error("User not logged in")
         return redirect(url_for("auth.index"))
 
-    logging.info("User logged in")
-    return render_template(
+    logger.info("User logged in")
+    return utils.render_page(
         "dashboard.html", username=session.get("username"), role=session.get("role")
     )
 
@@ -106,21 +117,24 @@ def logout():
     }
 
     try:
-        response = requests.post(
+        response = utils.keycloak_request(
+            "POST",
             current_app.config["KEYCLOAK_REALM_ISTIO_OPENID_LOGOUT_URL"],
             data=data,
             headers=headers,
-            verify=False,
         )
         if response.status_code in [200, 201, 202, 203, 204]:
+            current_app.extensions["role_cache"].invalidate(
+                session.get("keycloak_user_id")
+            )
             session.clear()
             return jsonify({"success": True, "redirect": url_for("auth.index")})
         else:
-            logging.error(f"Logout failed: {response.text}")
+            logger.error("Logout failed: %s", response.text)
             return (
                 jsonify({"success": False, "message": "Logout failed"}),
                 response.status_code,
             )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error during logout: {e}")
+        logger.error("Error during logout: %s", e)
         return jsonify({"success": False, "message": "Error during logout"}), 500
@@ -4,7 +4,6 @@ from flask import (
     Blueprint,
     jsonify,
     current_app,
-    render_template,
     session,
     request,
     redirect,
@@ -12,6 +11,10 @@ from flask import (
 )
 from datetime import datetime
 from . import routes_utils as utils
+from .list_query import ListQueryError
+from .logging_config import payload_logger
+
+logger = logging.getLogger(__name__)
 
 books_info_bp = Blueprint("books", __name__, url_prefix="/books")
 
@@ -21,6 +24,21 @@ def update_role():
     utils.update_role()
 
 
+def transform_reviews(input_data):
+    transformed_data = [
+        {
+            "reviewId": review["reviewId"],
+            "reviewer": review["user"]["username"],
+            "text": review["reviewText"],
+            "date": datetime.fromisoformat(review["reviewDate"]).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            ),
+        }
+        for review in input_data
+    ]
+    return transformed_data
+
+
 @books_info_bp.route("", methods=["GET", "POST"])
 def handle_books():
     if request.method == "GET":
@@ -31,17 +49,22 @@ def handle_books():
 
 def get_books():
     try:
-        books_data = utils.make_authenticated_get_request(
-            f"{current_app.config['BOOKS_SERVICE_URL']}/books/approved"
+        query = utils.list_query_from_request()
+        books_data = utils.make_cached_get_request(
+            "books_approved",
+            "all",
+            f"{current_app.config['BOOKS_SERVICE_URL']}/books/approved",
         )
-        return jsonify(books_data)
+        return utils.list_response(books_data, query)
+    except ListQueryError as e:
+        return jsonify({"error": str(e)}), 400
     except utils.NoPermissionError:
         return (
             jsonify({"error": "You do not have permission to access this resource."}),
             403,
         )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return jsonify({"error": "Error fetching books data."}), 500
 
 
@@ -51,6 +74,8 @@ def add_book():
         response = utils.make_authenticated_post_request(
             f"{current_app.config['BOOKS_SERVICE_URL']}/books/add", data
         )
+        utils.invalidate_book_responses(["book_title", "book_details"], data["isbn"])
+        utils.notify_pending_changed()
         return jsonify(response)
     except utils.NoPermissionError:
         return (
@@ -58,7 +83,7 @@ def add_book():
             403,
         )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return jsonify({"error": "Error adding book."}), 500
 
 
@@ -87,6 +112,10 @@ def delete_book(id):
         response = utils.make_authenticated_delete_request(
             f"{current_app.config['BOOKS_SERVICE_URL']}/books/delete/{id}"
         )
+        utils.invalidate_cached_responses("books_approved")
+        utils.invalidate_book_responses(
+            ["book_title", "book_details", "book_ratings", "book_reviews"]
+        )
         return jsonify(response)
     except utils.NoPermissionError:
         return (
@@ -94,7 +123,7 @@ def delete_book(id):
             403,
         )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return jsonify({"error": "Error deleting book."}), 500
 
 
@@ -104,6 +133,7 @@ def delete_review(id):
         response = utils.make_authenticated_delete_request(
             f"{current_app.config['BOOKS_SERVICE_URL']}/reviews/delete/{id}"
         )
+        utils.invalidate_book_responses(["book_reviews"])
         return jsonify(response)
     except utils.NoPermissionError:
         return (
@@ -111,7 +141,7 @@ def delete_review(id):
             403,
         )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return jsonify({"error": "Error deleting review."}), 500
 
 
@@ -120,13 +150,17 @@ def book_page(isbn):
     username = session.get("username")
     role = session.get("role")
     try:
-        response = utils.make_authenticated_get_request(
-            f"{current_app.config['BOOKS_SERVICE_URL']}/books/title/{isbn}"
+        response = utils.parse_upstream_body(
+            utils.make_cached_get_request(
+                "book_title",
+                isbn,
+                f"{current_app.config['BOOKS_SERVICE_URL']}/books/title/{isbn}",
+            )
         )
         book_id = list(response.keys())[0]
         title = response[book_id]
-        logging.info(f"Fetched title: {title}")
-        return render_template(
+        logger.debug("Fetched title: %s", title)
+        return utils.render_page(
             "book_page.html",
             title=title,
             isbn=isbn,
@@ -135,10 +169,10 @@ def book_page(isbn):
             id=book_id,
         )
     except utils.NoPermissionError:
-        logging.error(
+        logger.error(
             "User does not have permission to access the presentation page for %s", isbn
         )
-        return render_template(
+        return utils.render_page(
             "book_page.html",
             title="Loading...",
             isbn=isbn,
@@ -148,20 +182,84 @@ def book_page(isbn):
         )
 
 
+@books_info_bp.route("/<isbn>/bundle", methods=["GET"])
+def get_book_bundle(isbn):
+    books_service_url = current_app.config["BOOKS_SERVICE_URL"]
+    results = utils.fetch_authenticated_concurrently(
+        {
+            "title": f"{books_service_url}/books/title/{isbn}",
+            "details": f"{books_service_url}/books/{isbn}",
+            "reviews": f"{books_service_url}/reviews/by-isbn/approved/{isbn}",
+            "ratings": f"{books_service_url}/books/ratings/{isbn}",
+        },
+        cache_keys={
+            "title": ("book_title", isbn),
+            "details": ("book_details", isbn),
+            "reviews": ("book_reviews", isbn),
+            "ratings": ("book_ratings", isbn),
+        },
+    )
+
+    bundle = {}
+    for part, result in results.items():
+        if isinstance(result, utils.NoPermissionError):
+            bundle[part] = {
+                "status": 403,
+                "error": "You do not have permission to access this resource.",
+            }
+        elif isinstance(result, Exception) or result is None:
+            logger.error("Error fetching %s for %s: %s", part, isbn, result)
+            bundle[part] = {"status": 502, "error": f"Error fetching {part} data."}
+        elif not result.ok:
+            logger.error(
+                "Books service answered %s for %s of %s", result.status_code, part, isbn
+            )
+            bundle[part] = {
+                "status": result.status_code,
+                "error": f"Error fetching {part} data.",
+            }
+        else:
+            try:
+                bundle[part] = {"status": 200, "data": parse_bundle_part(part, result)}
+            except (AttributeError, IndexError, KeyError, TypeError, ValueError) as e:
+                logger.error("Malformed %s data for %s: %r", part, isbn, e)
+                bundle[part] = {"status": 502, "error": f"Malformed {part} data."}
+
+    statuses = {part["status"] for part in bundle.values()}
+    if 200 in statuses:
+        return jsonify(bundle)
+    # When every part failed the same way (e.g. 404 for an unknown isbn), so
+    # does the bundle.
+    status = statuses.pop() if len(statuses) == 1 else 502
+    return jsonify(bundle), status if 400 <= status < 500 else 502
+
+
+def parse_bundle_part(part, body):
+    data = utils.parse_upstream_body(body)
+    if part == "title":
+        book_id = list(data.keys())[0]
+        return {"id": book_id, "title": data[book_id]}
+    if part == "reviews":
+        return transform_reviews(data)
+    return data
+
+
 @books_info_bp.route("/details/<isbn>", methods=["GET"])
 def get_book_details(isbn):
     try:
-        book_data = utils.make_authenticated_get_request(
-            f"{current_app.config['BOOKS_SERVICE_URL']}/books/{isbn}"
+        book_data = utils.make_cached_get_request(
+            "book_details",
+            isbn,
+            f"{current_app.config['BOOKS_SERVICE_URL']}/books/{isbn}",
         )
-        return jsonify(book_data)
+        return utils.passthrough_response(book_data)
     except utils.NoPermissionError:
         return (
             jsonify({"error": "You do not have permission to access this resource."}),
             403,
         )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return jsonify({"error": "Error fetching book data."}), 500
 
 
@@ -174,23 +272,13 @@ def book_reviews(isbn):
 
 
 def get_book_reviews(isbn):
-    def transform_reviews(input_data):
-        transformed_data = [
-            {
-                "reviewId": review["reviewId"],
-                "reviewer": review["user"]["username"],
-                "text": review["reviewText"],
-                "date": datetime.fromisoformat(review["reviewDate"]).strftime(
-                    "%Y-%m-%d %H:%M:%S"
-                ),
-            }
-            for review in input_data
-        ]
-        return transformed_data
-
     try:
-        json_response = utils.make_authenticated_get_request(
-            f"{current_app.config['BOOKS_SERVICE_URL']}/reviews/by-isbn/approved/{isbn}"
+        json_response = utils.parse_upstream_body(
+            utils.make_cached_get_request(
+                "book_reviews",
+                isbn,
+                f"{current_app.config['BOOKS_SERVICE_URL']}/reviews/by-isbn/approved/{isbn}",
+            )
         )
         reviews_data = transform_reviews(json_response)
         return jsonify(reviews_data)
@@ -200,17 +288,19 @@ def get_book_reviews(isbn):
             403,
         )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return jsonify({"error": "Error fetching reviews data."}), 500
 
 
 def add_review(isbn):
     data = extract_review_data(isbn)
-    logging.info(f"Adding review: {data}")
+    payload_logger.debug("Adding review: %s", data)
     try:
         response = utils.make_authenticated_post_request(
             f"{current_app.config['BOOKS_SERVICE_URL']}/reviews/add", data
         )
+        utils.invalidate_book_responses(["book_reviews"], isbn)
+        utils.notify_pending_changed()
         return jsonify(response)
     except utils.NoPermissionError:
         return (
@@ -218,22 +308,24 @@ def add_review(isbn):
             403,
         )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return jsonify({"error": "Error adding review."}), 500
 
 
 @books_info_bp.route("/ratings/<isbn>", methods=["GET"])
 def get_book_ratings(isbn):
     try:
-        ratings_data = utils.make_authenticated_get_request(
-            f"{current_app.config['BOOKS_SERVICE_URL']}/books/ratings/{isbn}"
+        ratings_data = utils.make_cached_get_request(
+            "book_ratings",
+            isbn,
+            f"{current_app.config['BOOKS_SERVICE_URL']}/books/ratings/{isbn}",
         )
-        return jsonify(ratings_data)
+        return utils.passthrough_response(ratings_data)
     except utils.NoPermissionError:
         return (
             jsonify({"error": "You do not have permission to access this resource."}),
             403,
         )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return jsonify({"error": "Error fetching ratings data."}), 500
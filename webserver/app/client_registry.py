@@ -0,0 +1,47 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ClientIdRegistry:
+    """Keeps the internal Keycloak UUID of a client once it has been resolved.
+
+    The UUID is looked up lazily on first use and then pinned for the life of
+    the process. It is only replaced once Keycloak reports a different one,
+    e.g. after the client was recreated.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._client_id = None
+        self._lock = threading.Lock()
+        self.lookups = 0
+
+    def get(self, admin_token):
+        client_id = self._client_id
+        if client_id:
+            return client_id
+
+        with self._lock:
+            if self._client_id is None:
+                self.lookups += 1
+                self._client_id = self.loader(admin_token)
+            return self._client_id
+
+    def verify(self, admin_token, client_id):
+        """Look the client up again after a call with ``client_id`` answered 404.
+
+        The 404 may be about the user rather than the client, so the pinned
+        id is only replaced when the lookup returns a different one.
+        """
+        with self._lock:
+            if self._client_id != client_id:
+                return
+            self.lookups += 1
+            fresh_client_id = self.loader(admin_token)
+            if fresh_client_id and fresh_client_id != client_id:
+                logger.warning(
+                    "Replacing stale client id %s with %s", client_id, fresh_client_id
+                )
+                self._client_id = fresh_client_id
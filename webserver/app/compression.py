@@ -0,0 +1,291 @@
+import threading
+import zlib
+from collections import OrderedDict
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class GzipCodec:
+    name = "gzip"
+
+    def compress(self, data, level):
+        compressor = self.compressor(level)
+        return compressor.compress(data) + compressor.finish()
+
+    def compressor(self, level):
+        # wbits=31 writes a gzip header and trailer around the deflate stream.
+        compressobj = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return StreamCompressor(
+            compressobj.compress,
+            lambda: compressobj.flush(zlib.Z_SYNC_FLUSH),
+            compressobj.flush,
+        )
+
+
+class BrotliCodec:
+    name = "br"
+
+    def compress(self, data, level):
+        return brotli.compress(data, quality=level)
+
+    def compressor(self, level):
+        compressobj = brotli.Compressor(quality=level)
+        return StreamCompressor(
+            compressobj.process, compressobj.flush, compressobj.finish
+        )
+
+
+class ZstdCodec:
+    name = "zstd"
+
+    def compress(self, data, level):
+        return zstandard.ZstdCompressor(level=level).compress(data)
+
+    def compressor(self, level):
+        compressobj = zstandard.ZstdCompressor(level=level).compressobj()
+        return StreamCompressor(
+            compressobj.compress,
+            lambda: compressobj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressobj.flush,
+        )
+
+
+class StreamCompressor:
+    """Uniform ``compress``/``flush``/``finish`` over the codec libraries."""
+
+    def __init__(self, compress, flush, finish):
+        self.compress = compress
+        self.flush = flush
+        self.finish = finish
+
+
+def available_codecs():
+    codecs = {"gzip": GzipCodec()}
+    if brotli is not None:
+        codecs["br"] = BrotliCodec()
+    if zstandard is not None:
+        codecs["zstd"] = ZstdCodec()
+    return codecs
+
+
+def negotiate_encoding(accept_encodings, available):
+    """Pick the acceptable encoding with the highest quality, or None for identity.
+
+    ``available`` is in order of preference, which breaks ties in quality.
+    """
+    best, best_quality = None, 0
+    for encoding in available:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def encoded_etag(etag, encoding):
+    """Strong ETag of the ``encoding`` representation of the body tagged ``etag``."""
+    return f"{etag}-{encoding}"
+
+
+def matching_etag(if_none_match, etag, encoding=None):
+    """The form of ``etag`` that ``if_none_match`` names, or None.
+
+    A client that was sent the ``encoding`` representation revalidates with
+    its encoded ETag, so that form matches as well as the identity one.
+    """
+    candidates = [etag]
+    if encoding is not None:
+        candidates.append(encoded_etag(etag, encoding))
+    for candidate in candidates:
+        if candidate in if_none_match:
+            return candidate
+    return None
+
+
+class CompressedBodyCache:
+    """Compressed bodies keyed by strong ETag and encoding, bounded in bytes.
+
+    A strong ETag names exactly one body, so entries never need invalidating:
+    once the response cache hands out new content it carries a new ETag.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def set(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self._size}
+
+
+class ResponseCompressor:
+    """Compresses eligible responses with the best encoding the client accepts.
+
+    Buffered bodies under ``min_size`` are sent as is. Streamed bodies are
+    compressed chunk by chunk, each chunk flushed so the client gets it
+    right away, at the cheaper ``streaming_levels``. Server-Sent Events are
+    never touched. Bodies with a strong ETag reuse earlier compressions of
+    the same bytes, so response cache hits are only compressed once, and
+    are sent with the ETag of their encoding (``encoded_etag``): a strong
+    ETag names exact bytes, which the identity one no longer does.
+    """
+
+    EXCLUDED_MIMETYPES = {"text/event-stream"}
+
+    def __init__(
+        self,
+        codecs,
+        preference,
+        mimetypes,
+        min_size,
+        levels,
+        streaming_levels,
+        body_cache=None,
+    ):
+        self.codecs = codecs
+        self.encodings = [name for name in preference if name in codecs]
+        self.mimetypes = set(mimetypes) - self.EXCLUDED_MIMETYPES
+        self.min_size = min_size
+        self.levels = levels
+        self.streaming_levels = streaming_levels
+        self.body_cache = body_cache
+        self._lock = threading.Lock()
+        self.compressed = {name: 0 for name in self.encodings}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cache_hits = 0
+
+    def is_eligible(self, response):
+        return (
+            response.mimetype in self.mimetypes
+            and "Content-Encoding" not in response.headers
+            and not response.direct_passthrough
+            and response.status_code >= 200
+            and response.status_code not in (204, 206, 304)
+            and "no-transform" not in response.headers.get("Cache-Control", "")
+        )
+
+    def __call__(self, response):
+        if not self.is_eligible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            self._compress_stream(response, encoding)
+        else:
+            self._compress_body(response, encoding)
+        return response
+
+    def negotiate(self):
+        return negotiate_encoding(request.accept_encodings, self.encodings)
+
+    def _compress_body(self, response, encoding):
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return
+
+        etag, weak = response.get_etag()
+        cache_key = f"{etag}:{encoding}" if etag and not weak else None
+        body = None
+        if cache_key and self.body_cache is not None:
+            body = self.body_cache.get(cache_key)
+            if body is not None:
+                self.cache_hits += 1
+        if body is None:
+            body = self.codecs[encoding].compress(data, self.levels[encoding])
+            if cache_key and self.body_cache is not None:
+                self.body_cache.set(cache_key, body)
+        if len(body) >= len(data):
+            return
+
+        response.set_data(body)
+        self._mark_encoded(response, encoding)
+        self._count(encoding, len(data), len(body))
+
+    def _compress_stream(self, response, encoding):
+        compressor = self.codecs[encoding].compressor(self.streaming_levels[encoding])
+        chunks = response.iter_encoded()
+        original = response.response
+
+        def generate():
+            size_in = size_out = 0
+            try:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    size_in += len(chunk)
+                    out = compressor.compress(chunk) + compressor.flush()
+                    size_out += len(out)
+                    yield out
+                out = compressor.finish()
+                size_out += len(out)
+                yield out
+            finally:
+                self._count(encoding, size_in, size_out)
+
+        response.response = generate()
+        # The response now closes the generator; the original body still needs it.
+        if hasattr(original, "close"):
+            response.call_on_close(original.close)
+        response.headers.pop("Content-Length", None)
+        self._mark_encoded(response, encoding)
+
+    def _mark_encoded(self, response, encoding):
+        response.content_encoding = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(encoded_etag(etag, encoding))
+
+    def _count(self, encoding, size_in, size_out):
+        with self._lock:
+            self.compressed[encoding] += 1
+            self.bytes_in += size_in
+            self.bytes_out += size_out
+
+    def stats(self):
+        stats = {
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "cache_hits": self.cache_hits,
+        }
+        stats.update({f"{name}_responses": n for name, n in self.compressed.items()})
+        if self.body_cache is not None:
+            stats.update(
+                {
+                    f"cache_{name}": value
+                    for name, value in self.body_cache.stats().items()
+                }
+            )
+        return stats
@@ -33,3 +33,160 @@ class Config:
     KEYCLOAK_USERS_URL = KEYCLOAK_URL + "/admin/realms/Istio/users"
     KEYCLOAK_CLIENTS_URL = KEYCLOAK_URL + "/admin/realms/Istio/clients"
     BOOKS_SERVICE_URL: str = os.getenv("BOOKS_SERVICE_URL")
+    # Cached roles are used for at most ROLE_CACHE_TTL + ROLE_CACHE_STALE_TTL
+    # seconds (45 by default) after they were loaded: that is how long a
+    # demoted user keeps their old roles while Keycloak cannot be reached.
+    ROLE_CACHE_TTL: int = int(os.getenv("ROLE_CACHE_TTL", "30"))
+    ROLE_CACHE_STALE_TTL: int = int(os.getenv("ROLE_CACHE_STALE_TTL", "15"))
+    ROLE_CACHE_MAX_ENTRIES: int = int(os.getenv("ROLE_CACHE_MAX_ENTRIES", "10000"))
+    KEYCLOAK_ADMIN_USERNAME: str = os.getenv("KEYCLOAK_ADMIN_USERNAME", "admin")
+    KEYCLOAK_ADMIN_PASSWORD: str = os.getenv("KEYCLOAK_ADMIN_PASSWORD", "admin")
+    ADMIN_TOKEN_EXPIRY_MARGIN: int = int(os.getenv("ADMIN_TOKEN_EXPIRY_MARGIN", "30"))
+    JWT_LOCAL_VERIFICATION: bool = (
+        os.getenv("JWT_LOCAL_VERIFICATION", "true").lower() == "true"
+    )
+    JWT_ISSUER: str = os.getenv("JWT_ISSUER", KEYCLOAK_REALM_ISTIO_URL)
+    JWT_AUDIENCE: str = os.getenv("JWT_AUDIENCE", "")
+    JWT_LEEWAY: int = int(os.getenv("JWT_LEEWAY", "10"))
+    JWKS_URL = KEYCLOAK_REALM_ISTIO_OPENID_URL + "/certs"
+    JWKS_LIFESPAN: int = int(os.getenv("JWKS_LIFESPAN", "3600"))
+    JWKS_MIN_REFETCH_INTERVAL: int = int(os.getenv("JWKS_MIN_REFETCH_INTERVAL", "30"))
+    BOOKS_SERVICE_POOL_SIZE: int = int(os.getenv("BOOKS_SERVICE_POOL_SIZE", "16"))
+    BOOKS_SERVICE_TIMEOUT: float = float(os.getenv("BOOKS_SERVICE_TIMEOUT", "5"))
+    KEYCLOAK_POOL_SIZE: int = int(os.getenv("KEYCLOAK_POOL_SIZE", "8"))
+    KEYCLOAK_TIMEOUT: float = float(os.getenv("KEYCLOAK_TIMEOUT", "1"))
+    KEYCLOAK_VERIFY_TLS: bool = (
+        os.getenv("KEYCLOAK_VERIFY_TLS", "false").lower() == "true"
+    )
+    UPSTREAM_CONNECT_RETRIES: int = int(os.getenv("UPSTREAM_CONNECT_RETRIES", "1"))
+    ASYNC_MODE: bool = os.getenv("ASYNC_MODE", "false").lower() == "true"
+    FANOUT_MAX_WORKERS: int = int(os.getenv("FANOUT_MAX_WORKERS", "16"))
+    RESPONSE_CACHE_ENABLED: bool = (
+        os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    )
+    RESPONSE_CACHE_BACKEND: str = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_REDIS_URL: str = os.getenv("RESPONSE_CACHE_REDIS_URL", "")
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(
+        os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "4096")
+    )
+    RESPONSE_CACHE_STALE_TTL: int = int(os.getenv("RESPONSE_CACHE_STALE_TTL", "60"))
+    # Per-route TTLs in seconds, as "route=ttl" pairs.
+    RESPONSE_CACHE_TTLS: str = os.getenv(
+        "RESPONSE_CACHE_TTLS",
+        "books_approved=30,book_details=300,book_ratings=60,"
+        "book_title=3600,book_reviews=30",
+    )
+    LIST_MAX_LIMIT: int = int(os.getenv("LIST_MAX_LIMIT", "500"))
+    SESSION_TYPE: str = os.getenv("SESSION_TYPE", "memory")
+    SESSION_REDIS_URL: str = os.getenv("SESSION_REDIS_URL", "")
+    SESSION_MAX_ENTRIES: int = int(os.getenv("SESSION_MAX_ENTRIES", "50000"))
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    # Per-logger levels, as "logger=LEVEL" pairs.
+    LOG_LEVELS: str = os.getenv("LOG_LEVELS", "urllib3=WARNING")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    LOG_PAYLOAD_MAX_CHARS: int = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "512"))
+    LOG_PAYLOAD_SAMPLE_RATE: float = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.1"))
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    SERVER_TIMING_ENABLED: bool = (
+        os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+    )
+    # One of "none", "stdout", "file" or "otlp".
+    TRACE_EXPORTER: str = os.getenv("TRACE_EXPORTER", "none")
+    TRACE_FILE_PATH: str = os.getenv("TRACE_FILE_PATH", "/tmp/webserver-spans.jsonl")
+    TRACE_OTLP_ENDPOINT: str = os.getenv(
+        "TRACE_OTLP_ENDPOINT", "http://otel-collector:4318/v1/traces"
+    )
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+    UPSTREAM_BREAKER_FAILURE_THRESHOLD: int = int(
+        os.getenv("UPSTREAM_BREAKER_FAILURE_THRESHOLD", "5")
+    )
+    UPSTREAM_BREAKER_RESET_TIMEOUT: float = float(
+        os.getenv("UPSTREAM_BREAKER_RESET_TIMEOUT", "10")
+    )
+    UPSTREAM_GET_RETRIES: int = int(os.getenv("UPSTREAM_GET_RETRIES", "2"))
+    UPSTREAM_RETRY_BUDGET_RATIO: float = float(
+        os.getenv("UPSTREAM_RETRY_BUDGET_RATIO", "0.1")
+    )
+    UPSTREAM_RETRY_BUDGET_MIN_PER_SECOND: float = float(
+        os.getenv("UPSTREAM_RETRY_BUDGET_MIN_PER_SECOND", "1")
+    )
+    UPSTREAM_RETRY_BACKOFF_BASE: float = float(
+        os.getenv("UPSTREAM_RETRY_BACKOFF_BASE", "0.05")
+    )
+    UPSTREAM_RETRY_BACKOFF_CAP: float = float(
+        os.getenv("UPSTREAM_RETRY_BACKOFF_CAP", "1.0")
+    )
+    UPSTREAM_COALESCING_ENABLED: bool = (
+        os.getenv("UPSTREAM_COALESCING_ENABLED", "true").lower() == "true"
+    )
+    BULK_MAX_ITEMS: int = int(os.getenv("BULK_MAX_ITEMS", "500"))
+    BULK_MAX_CONCURRENCY: int = int(os.getenv("BULK_MAX_CONCURRENCY", "8"))
+    PENDING_FEED_INTERVAL: float = float(os.getenv("PENDING_FEED_INTERVAL", "5"))
+    # Threads serving requests: gunicorn's, or asgi.py's pool in ASYNC_MODE.
+    REQUEST_THREADS: int = int(
+        os.getenv("ASGI_THREADS", "256")
+        if ASYNC_MODE
+        else os.getenv("GUNICORN_THREADS", "16")
+    )
+    # Each open stream holds one of those threads for up to STREAM_MAX_DURATION,
+    # so by default streams get at most a quarter of them.
+    STREAM_MAX_SUBSCRIBERS: int = int(
+        os.getenv("STREAM_MAX_SUBSCRIBERS", str(max(1, REQUEST_THREADS // 4)))
+    )
+    STREAM_KEEPALIVE_INTERVAL: float = float(
+        os.getenv("STREAM_KEEPALIVE_INTERVAL", "15")
+    )
+    # Streams are closed after this many seconds; browsers reconnect, which
+    # also renews the access token the feed polls with.
+    STREAM_MAX_DURATION: float = float(os.getenv("STREAM_MAX_DURATION", "300"))
+    # Fingerprinted assets change name with their content, so they never go stale.
+    STATIC_ASSET_MAX_AGE: int = int(os.getenv("STATIC_ASSET_MAX_AGE", "31536000"))
+    COMPRESSION_ENABLED: bool = (
+        os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    )
+    # Content-Encodings in order of preference; br and zstd need the optional
+    # brotli and zstandard packages and are skipped without them.
+    COMPRESSION_ENCODINGS: str = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip")
+    COMPRESSION_MIMETYPES: str = os.getenv(
+        "COMPRESSION_MIMETYPES",
+        "application/json,text/html,text/css,text/plain,text/javascript,"
+        "application/javascript",
+    )
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    # Levels as "encoding=level" pairs. Streamed bodies are compressed as they
+    # are produced, so they use cheaper levels.
+    COMPRESSION_LEVELS: str = os.getenv("COMPRESSION_LEVELS", "gzip=6,br=5,zstd=6")
+    COMPRESSION_STREAMING_LEVELS: str = os.getenv(
+        "COMPRESSION_STREAMING_LEVELS", "gzip=1,br=1,zstd=1"
+    )
+    COMPRESSION_CACHE_MAX_BYTES: int = int(
+        os.getenv("COMPRESSION_CACHE_MAX_BYTES", str(16 * 1024 * 1024))
+    )
+    TEMPLATE_CACHE_ENABLED: bool = (
+        os.getenv("TEMPLATE_CACHE_ENABLED", "true").lower() == "true"
+    )
+    # Rendered pages and fragments kept, in characters of markup.
+    TEMPLATE_CACHE_MAX_CHARS: int = int(
+        os.getenv("TEMPLATE_CACHE_MAX_CHARS", str(8 * 1024 * 1024))
+    )
+
+
+def parse_pairs(name, spec, convert=str):
+    """Parse a ``"key=value,key=value"`` setting into a dict.
+
+    Blank entries are skipped. Anything else that is not a non-empty key and
+    a value ``convert`` accepts raises ValueError naming the setting.
+    """
+    pairs = {}
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        key, sep, value = (part.strip() for part in entry.partition("="))
+        if not sep or not key or not value:
+            raise ValueError(f"{name}: expected key=value, got {entry.strip()!r}")
+        try:
+            pairs[key] = convert(value)
+        except ValueError:
+            raise ValueError(f"{name}: invalid value for {key}: {value!r}") from None
+    return pairs
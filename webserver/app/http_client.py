@@ -0,0 +1,158 @@
+import time
+from http.cookiejar import DefaultCookiePolicy
+from typing import NamedTuple
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from . import tracing
+
+BOOKS_UPSTREAM = "books"
+KEYCLOAK_UPSTREAM = "keycloak"
+
+
+class UpstreamBody(NamedTuple):
+    """An upstream response body kept as raw bytes so it can be forwarded as is."""
+
+    content: bytes
+    content_type: str
+    status_code: int
+
+    @property
+    def is_json(self):
+        return self.content_type.split(";")[0].strip() == "application/json"
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+
+class UpstreamHttpClient:
+    """Keep-alive connection pools shared by every thread, one per upstream.
+
+    Each upstream gets its own ``requests.Session`` so pool sizes, timeouts
+    and TLS verification can differ between the books service and Keycloak.
+    Sessions never store cookies, which keeps them safe to share across
+    gunicorn threads and users.
+
+    An optional ``UpstreamGuard`` per upstream adds a circuit breaker and
+    budgeted retries of idempotent calls on top of the pool.
+    """
+
+    def __init__(self, metrics=None):
+        self._upstreams = {}
+        self._guards = {}
+        self.metrics = metrics
+
+    def register(
+        self, name, pool_size, timeout, connect_retries=0, verify=True, guard=None
+    ):
+        session = requests.Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        session.verify = verify
+        # Only connection failures are retried here: the request never reached
+        # the upstream, so retrying is safe for every method.
+        retries = Retry(
+            total=connect_retries,
+            connect=connect_retries,
+            read=0,
+            status=0,
+            backoff_factor=0.05,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=pool_size,
+            max_retries=retries,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        self._upstreams[name] = (session, timeout)
+        if guard is not None:
+            self._guards[name] = guard
+
+    def request(self, name, method, url, retry=True, **kwargs):
+        """Send a request through the upstream's guard, if it has one.
+
+        ``retry=False`` turns off retries for GETs that are not idempotent.
+        """
+        guard = self._guards.get(name)
+        if guard is None:
+            return self._send(name, method, url, **kwargs)
+
+        # The breaker sees one outcome per call, once retries are exhausted.
+        guard.acquire()
+        attempt = 0
+        recorded = False
+        try:
+            while True:
+                try:
+                    response = self._send(name, method, url, **kwargs)
+                except requests.exceptions.RequestException as e:
+                    delay = guard.retry_delay(method, attempt) if retry else None
+                    if delay is None:
+                        recorded = True
+                        guard.record(error=e)
+                        raise
+                else:
+                    failed = guard.is_failure(status=response.status_code)
+                    delay = (
+                        guard.retry_delay(method, attempt) if failed and retry else None
+                    )
+                    if delay is None:
+                        recorded = True
+                        guard.record(status=response.status_code)
+                        return response
+                attempt += 1
+                time.sleep(delay)
+        except BaseException as e:
+            # Anything else (a bug, a cancelled task) still ends the call, and
+            # must not leave a half-open probe in flight forever.
+            if not recorded:
+                guard.record(error=e)
+            raise
+
+    def _send(self, name, method, url, **kwargs):
+        session, timeout = self._upstreams[name]
+        kwargs.setdefault("timeout", timeout)
+        with tracing.span(
+            name, "client", desc=f"{method} {urlsplit(url).path}", url=url
+        ) as span:
+            kwargs["headers"] = tracing.inject(kwargs.get("headers"))
+            started = self.metrics.start(name) if self.metrics is not None else None
+            try:
+                response = session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if started is not None:
+                    self.metrics.finish(name, method, started, error=e)
+                span.set("error", type(e).__name__)
+                raise
+            if started is not None:
+                self.metrics.finish(name, method, started, status=response.status_code)
+            span.set("status", response.status_code)
+            return response
+
+    def stats(self):
+        stats = {}
+        for name, (session, _) in self._upstreams.items():
+            # Both schemes are mounted on the same adapter. The pool container
+            # only supports locked access through keys() and lookups.
+            container = session.get_adapter("http://").poolmanager.pools
+            pools = [container.get(key) for key in container.keys()]
+            pools = [pool for pool in pools if pool is not None]
+            stats[f"{name}_pools"] = len(pools)
+            stats[f"{name}_connections_opened"] = sum(
+                pool.num_connections for pool in pools
+            )
+            # Empty pool slots are held as None placeholders.
+            stats[f"{name}_idle_connections"] = sum(
+                1
+                for pool in pools
+                for conn in list(pool.pool.queue)
+                if conn is not None
+            )
+        return stats
+
+    def close(self):
+        for session, _ in self._upstreams.values():
+            session.close()
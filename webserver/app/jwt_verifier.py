@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+import jwt
+import requests
+from .http_client import KEYCLOAK_UPSTREAM
+
+logger = logging.getLogger(__name__)
+
+
+class JwksCache:
+    """Cached copy of a realm's JSON Web Key Set.
+
+    The key set is refetched once ``lifespan`` seconds have passed, or earlier
+    when a token is signed with a ``kid`` we have not seen yet (Keycloak key
+    rotation). Every refetch waits ``min_refetch_interval`` after the last
+    attempt, failed or not, so neither garbage tokens nor a JWKS outage can
+    hammer the realm. Until a refetch succeeds the last good keys are kept.
+    """
+
+    def __init__(self, http, jwks_url, lifespan=3600, min_refetch_interval=30):
+        self.http = http
+        self.jwks_url = jwks_url
+        self.lifespan = lifespan
+        self.min_refetch_interval = min_refetch_interval
+        self._keys = {}
+        self._fetched_at = float("-inf")
+        # Last fetch attempt, successful or not; every refetch is rate limited on it.
+        self._attempted_at = float("-inf")
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def get_signing_key(self, kid):
+        if time.monotonic() - self._fetched_at >= self.lifespan:
+            self._refetch_if_due()
+
+        key = self._keys.get(kid)
+        if key is None:
+            self._refetch_if_due()
+            key = self._keys.get(kid)
+        if key is None:
+            raise jwt.InvalidKeyError(f"Unknown signing key id: {kid}")
+        return key
+
+    def _refetch_if_due(self):
+        """Refetch unless an attempt was made in the last ``min_refetch_interval``.
+
+        Callers that arrive while another thread is fetching wait for it to
+        finish, so they see the keys it fetched.
+        """
+        with self._lock:
+            if time.monotonic() - self._attempted_at < self.min_refetch_interval:
+                return
+            self._attempted_at = time.monotonic()
+            try:
+                response = self.http.request(KEYCLOAK_UPSTREAM, "GET", self.jwks_url)
+                response.raise_for_status()
+                jwk_set = jwt.PyJWKSet.from_dict(response.json())
+            except (requests.exceptions.RequestException, jwt.PyJWKSetError) as e:
+                # Keep serving the keys we have; the next attempt waits its turn.
+                logger.error("Failed to fetch JWKS from %s: %s", self.jwks_url, e)
+                return
+            self.fetches += 1
+            self._keys = {key.key_id: key for key in jwk_set.keys}
+            self._fetched_at = time.monotonic()
+
+
+class TokenVerifier:
+    """Validates Keycloak access tokens locally and reads client roles from them."""
+
+    def __init__(self, jwks, issuer, client_id, audience=None, leeway=10):
+        self.jwks = jwks
+        self.issuer = issuer
+        self.client_id = client_id
+        self.audience = audience
+        self.leeway = leeway
+
+    def verify(self, token):
+        header = jwt.get_unverified_header(token)
+        signing_key = self.jwks.get_signing_key(header.get("kid"))
+        claims = jwt.decode(
+            token,
+            signing_key.key,
+            algorithms=[signing_key.algorithm_name],
+            issuer=self.issuer,
+            audience=self.audience,
+            leeway=self.leeway,
+            options={
+                "require": ["exp", "iat", "sub"],
+                "verify_aud": bool(self.audience),
+            },
+        )
+        if not self.audience and claims.get("azp") != self.client_id:
+            raise jwt.InvalidAudienceError(
+                f"Token was issued for {claims.get('azp')}, not {self.client_id}"
+            )
+        return claims
+
+    def roles(self, claims):
+        return (
+            claims.get("resource_access", {}).get(self.client_id, {}).get("roles", [])
+        )
@@ -0,0 +1,117 @@
+import base64
+import binascii
+import json
+from itertools import islice
+
+
+class ListQueryError(ValueError):
+    """Raised when pagination, filter or projection parameters are invalid."""
+
+
+FILTER_FIELDS = ("genre", "author")
+
+
+def encode_cursor(offset):
+    raw = json.dumps({"o": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset = json.loads(base64.urlsafe_b64decode(padded))["o"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ListQueryError("Invalid cursor.")
+    if not isinstance(offset, int) or offset < 0:
+        raise ListQueryError("Invalid cursor.")
+    return offset
+
+
+def field_value(item, name):
+    # Reviews carry their book's fields on the nested "book" object.
+    if name in item:
+        return item[name]
+    book = item.get("book")
+    return book.get(name) if isinstance(book, dict) else None
+
+
+class ListQuery:
+    """``limit``/``cursor`` pagination, field filters and ``fields=`` projection.
+
+    Items flow through a chain of generators, so the upstream list is the
+    only full copy held in memory: filtering, paging and projection touch at
+    most ``offset + limit + 1`` items and build only the returned page.
+    The cursor is an opaque offset into the filtered sequence.
+    """
+
+    def __init__(self, limit=None, offset=0, filters=None, fields=None):
+        self.limit = limit
+        self.offset = offset
+        self.filters = filters or {}
+        self.fields = fields
+
+    @classmethod
+    def from_args(cls, args, max_limit):
+        limit = args.get("limit")
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise ListQueryError("limit must be an integer.")
+            if not 1 <= limit <= max_limit:
+                raise ListQueryError(f"limit must be between 1 and {max_limit}.")
+
+        cursor = args.get("cursor")
+        offset = decode_cursor(cursor) if cursor else 0
+
+        filters = {
+            name: args[name].strip().lower()
+            for name in FILTER_FIELDS
+            if args.get(name, "").strip()
+        }
+
+        fields = args.get("fields")
+        if fields is not None:
+            fields = [field.strip() for field in fields.split(",") if field.strip()]
+            if not fields:
+                raise ListQueryError("fields must name at least one field.")
+
+        return cls(limit, offset, filters, fields)
+
+    @property
+    def is_identity(self):
+        return (
+            self.limit is None
+            and self.offset == 0
+            and not self.filters
+            and self.fields is None
+        )
+
+    def matches(self, item):
+        for name, expected in self.filters.items():
+            value = field_value(item, name)
+            if not isinstance(value, str) or value.lower() != expected:
+                return False
+        return True
+
+    def project(self, item):
+        if self.fields is None:
+            return item
+        return {field: item[field] for field in self.fields if field in item}
+
+    def apply(self, items, exclude=None):
+        """Return ``(page, next_cursor)``; ``next_cursor`` is None on the last page."""
+        selected = (
+            item
+            for item in items
+            if (exclude is None or not exclude(item)) and self.matches(item)
+        )
+        selected = islice(selected, self.offset, None)
+
+        if self.limit is None:
+            return [self.project(item) for item in selected], None
+
+        page = [self.project(item) for item in islice(selected, self.limit)]
+        has_more = next(selected, None) is not None
+        next_cursor = encode_cursor(self.offset + self.limit) if has_more else None
+        return page, next_cursor
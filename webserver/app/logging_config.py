@@ -0,0 +1,141 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+PAYLOAD_LOGGER_NAME = "app.payloads"
+
+# Upstream response bodies and other bulky lines go through this logger so
+# they can be sampled, truncated and levelled independently of the rest.
+payload_logger = logging.getLogger(PAYLOAD_LOGGER_NAME)
+
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+    "taskName",
+}
+
+_listener = None
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Renders each record as one JSON object per line.
+
+    Fields passed with ``extra=`` are added as top-level keys.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "location": f"{record.filename}:{record.funcName}:{record.lineno}",
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class AsyncQueueHandler(QueueHandler):
+    """Hands records over to a QueueListener thread instead of writing them inline.
+
+    The message is rendered in the calling thread, so mutable arguments are
+    not read after the caller moved on; the traceback is kept apart from the
+    message for the JSON formatter. When the queue is full, records are
+    dropped and counted instead of blocking the request.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class PayloadFilter(logging.Filter):
+    """Samples below-WARNING records and truncates their arguments.
+
+    Both happen before the message is rendered, so dropped lines cost
+    nothing and kept ones never format more than ``max_chars`` per argument
+    of a bytes body.
+    """
+
+    def __init__(self, sample_rate, max_chars):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.max_chars = max_chars
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING and random.random() >= self.sample_rate:
+            return False
+        if isinstance(record.args, tuple):
+            record.args = tuple(self.truncate(arg) for arg in record.args)
+        return True
+
+    def truncate(self, value):
+        if isinstance(value, (bytes, bytearray)):
+            size = len(value)
+            value = bytes(value[: self.max_chars]).decode("utf-8", errors="replace")
+        else:
+            value = str(value)
+            size = len(value)
+        if size > self.max_chars:
+            return f"{value[: self.max_chars]}... ({size} total)"
+        return value
+
+
+def start_queue_logging(handler, queue_size):
+    """Start the background writer for ``handler`` and return the handler to log to."""
+    global _listener, _queue_handler
+    stop_queue_logging()
+    log_queue = queue.Queue(queue_size)
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    _queue_handler = AsyncQueueHandler(log_queue)
+    return _queue_handler
+
+
+def queue_stats():
+    if _queue_handler is None:
+        return {}
+    return {
+        "queued": _queue_handler.queue.qsize(),
+        "dropped": _queue_handler.dropped,
+    }
+
+
+def stop_queue_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_queue_logging)
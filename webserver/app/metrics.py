@@ -0,0 +1,213 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in zip(labelnames, values)
+    )
+    return "{" + pairs + "}"
+
+
+class _ShardedMetric:
+    """Base for collectors that keep one value map per thread.
+
+    Threads only ever write to their own shard, so recording a sample takes
+    no lock; the shard list lock is taken once per thread and on scrape.
+    Scrapes merge a snapshot of every shard.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "values", None)
+        if shard is None:
+            shard = self._local.values = self._new_shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _new_shard(self):
+        return defaultdict(float)
+
+    def _snapshots(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+        return [shard.copy() for shard in shards]
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._render_samples())
+        return lines
+
+
+class Counter(_ShardedMetric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        self._shard()[labels] += amount
+
+    def _render_samples(self):
+        totals = defaultdict(float)
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] += value
+        for labels, value in sorted(totals.items()):
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {value:g}"
+
+
+class Gauge(Counter):
+    """Up/down gauge; per-thread deltas add up to the current value."""
+
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self._shard()[labels] -= amount
+
+
+class Histogram(_ShardedMetric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_shard(self):
+        # labels -> [count per bucket..., +Inf count, sum]
+        return {}
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            series = shard[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def _render_samples(self):
+        totals = {}
+        for shard in self._snapshots():
+            for labels, series in shard.items():
+                merged = totals.setdefault(labels, [0] * len(series))
+                for i, value in enumerate(list(series)):
+                    merged[i] += value
+
+        for labels, series in sorted(totals.items()):
+            cumulative = 0
+            bounds = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                label_text = format_labels(self.labelnames + ("le",), labels + (bound,))
+                yield f"{self.name}_bucket{label_text} {cumulative}"
+            label_text = format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {series[-1]:g}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+class MetricsRegistry:
+    """Holds the process's collectors and renders them in the Prometheus text format.
+
+    Components that already keep their own statistics (caches, pools, token
+    managers) register a ``stats`` callable instead; it is read on scrape and
+    every numeric entry becomes a gauge named ``<prefix>_<key>``.
+    """
+
+    def __init__(self, namespace="webserver"):
+        self.namespace = namespace
+        self._metrics = []
+        self._stats = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(f"{self.namespace}_{name}", documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(f"{self.namespace}_{name}", documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(
+            Histogram(f"{self.namespace}_{name}", documentation, labelnames, buckets)
+        )
+
+    def register_stats(self, prefix, documentation, stats):
+        self._stats.append((f"{self.namespace}_{prefix}", documentation, stats))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, documentation, stats in self._stats:
+            for key, value in sorted(stats().items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{key}"
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+class UpstreamMetrics:
+    """Latency, status, error and in-flight collectors for the upstream clients."""
+
+    def __init__(self, registry):
+        self.latency = registry.histogram(
+            "upstream_request_duration_seconds",
+            "Latency of upstream calls by upstream, method and status.",
+            ("upstream", "method", "status"),
+        )
+        self.errors = registry.counter(
+            "upstream_errors_total",
+            "Upstream calls that failed without a response.",
+            ("upstream", "method", "error"),
+        )
+        self.in_flight = registry.gauge(
+            "upstream_requests_in_flight",
+            "Upstream calls currently in progress.",
+            ("upstream",),
+        )
+
+    def start(self, upstream):
+        self.in_flight.inc(upstream)
+        return time.perf_counter()
+
+    def finish(self, upstream, method, started, status=None, error=None):
+        elapsed = time.perf_counter() - started
+        self.in_flight.dec(upstream)
+        if error is not None:
+            self.errors.inc(upstream, method, type(error).__name__)
+            status = "error"
+        self.latency.observe(elapsed, upstream, method, str(status))
@@ -0,0 +1,216 @@
+import logging
+import queue
+import threading
+from .routes_utils import NoPermissionError
+
+logger = logging.getLogger(__name__)
+
+# Put on a subscriber's queue to end its stream; the browser then reconnects.
+CLOSED = None
+
+
+class PendingFeedUnavailableError(Exception):
+    """Raised when the pending lists could not be loaded from the books service."""
+
+
+class PendingFeedFullError(Exception):
+    """Raised when the feed already has as many subscribers as it allows."""
+
+
+class Subscriber:
+    __slots__ = ("access_token", "scope", "events")
+
+    def __init__(self, access_token, scope, max_queue):
+        self.access_token = access_token
+        self.scope = scope
+        self.events = queue.Queue(max_queue)
+
+    def next_event(self, timeout):
+        """Return the next delta, ``CLOSED``, or raise ``queue.Empty`` after ``timeout``."""
+        return self.events.get(timeout=timeout)
+
+
+def diff_items(previous, current):
+    """Return ``(added, removed)`` between two id -> item mappings.
+
+    Items whose content changed are reported as added, so clients can
+    treat ``added`` as an upsert.
+    """
+    added = [item for item_id, item in current.items() if previous.get(item_id) != item]
+    removed = [item_id for item_id in previous if item_id not in current]
+    return added, removed
+
+
+class PendingFeed:
+    """Shares pollers of the pending moderation lists between stream subscribers.
+
+    Subscribers are grouped by permission scope (role), and each scope is
+    polled with the access token of its most recent subscriber, so nobody
+    sees lists fetched with another role's permissions. Polling only runs
+    while someone is subscribed. What changed since the previous poll is
+    pushed as ``{"target", "added", "removed"}`` deltas to the scope's
+    subscribers. Subscribers that fall behind or whose token is refused are
+    closed; the browser reconnects and gets a fresh snapshot.
+    """
+
+    def __init__(
+        self, fetch, id_fields, interval=5.0, max_subscribers=8, max_queue=100
+    ):
+        # fetch(target, access_token, scope) -> list of items, or None on failure
+        self.fetch = fetch
+        self.id_fields = id_fields
+        self.interval = interval
+        self.max_subscribers = max_subscribers
+        self.max_queue = max_queue
+        # scope -> target -> id -> item, for the scopes with subscribers.
+        self._items = {}
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.polls = 0
+        self.deltas = 0
+        self.dropped = 0
+
+    def subscribe(self, access_token, scope):
+        """Register a subscriber and return it with a snapshot of its scope's lists.
+
+        A scope nobody is subscribed with yet loads the lists with the
+        caller's token first, so callers without permission get
+        ``NoPermissionError`` instead of a stream.
+        """
+        subscriber = Subscriber(access_token, scope, self.max_queue)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise PendingFeedFullError
+            loaded = scope in self._items
+            self._subscribers.append(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="pending-feed", daemon=True
+                )
+                self._thread.start()
+
+        try:
+            if not loaded:
+                lists = self._fetch_all(access_token, scope)
+                if lists is None:
+                    raise PendingFeedUnavailableError
+                self._publish(scope, lists)
+        except BaseException:
+            self.unsubscribe(subscriber)
+            raise
+
+        with self._lock:
+            # Empty if the poller already closed this subscriber.
+            lists = self._items.get(scope, {})
+            snapshot = {
+                target: list(lists.get(target, {}).values())
+                for target in self.id_fields
+            }
+        return subscriber, snapshot
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._remove(subscriber)
+
+    def notify(self):
+        """Poll now instead of waiting for the interval, e.g. after a moderation action."""
+        self._wake.set()
+
+    def _fetch_all(self, access_token, scope):
+        lists = {}
+        for target in self.id_fields:
+            items = self.fetch(target, access_token, scope)
+            if not isinstance(items, list):
+                return None
+            lists[target] = items
+        return lists
+
+    def _publish(self, scope, lists):
+        with self._lock:
+            previous = self._items.get(scope)
+            if previous is None and not any(
+                subscriber.scope == scope for subscriber in self._subscribers
+            ):
+                # Everyone in this scope left while it was being fetched.
+                return
+            self._items[scope] = {}
+            for target, items in lists.items():
+                id_field = self.id_fields[target]
+                current = {item.get(id_field): item for item in items}
+                self._items[scope][target] = current
+                if previous is None:
+                    continue
+                added, removed = diff_items(previous[target], current)
+                if added or removed:
+                    self.deltas += 1
+                    delta = {"target": target, "added": added, "removed": removed}
+                    for subscriber in list(self._subscribers):
+                        if subscriber.scope == scope:
+                            self._push(subscriber, delta)
+
+    def _push(self, subscriber, event):
+        try:
+            subscriber.events.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            self._close(subscriber)
+
+    def _remove(self, subscriber):
+        # Called with the lock held.
+        if subscriber not in self._subscribers:
+            return
+        self._subscribers.remove(subscriber)
+        if not any(other.scope == subscriber.scope for other in self._subscribers):
+            # Reloaded with the next subscriber's token rather than kept stale.
+            self._items.pop(subscriber.scope, None)
+
+    def _close(self, subscriber):
+        # Called with the lock held.
+        self._remove(subscriber)
+        with subscriber.events.mutex:
+            subscriber.events.queue.clear()
+        subscriber.events.put_nowait(CLOSED)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self._lock:
+                if not self._subscribers:
+                    # Nobody is listening: stop until the next subscribe.
+                    self._thread = None
+                    return
+                # The most recent subscriber of each scope polls for it.
+                pollers = {
+                    subscriber.scope: subscriber for subscriber in self._subscribers
+                }
+            for subscriber in pollers.values():
+                self._poll(subscriber)
+
+    def _poll(self, subscriber):
+        try:
+            lists = self._fetch_all(subscriber.access_token, subscriber.scope)
+        except NoPermissionError:
+            logger.info("Pending feed token refused, closing its subscriber.")
+            with self._lock:
+                self._close(subscriber)
+            return
+        except Exception as e:
+            logger.error("Error polling pending lists: %s", e)
+            return
+
+        self.polls += 1
+        if lists is None:
+            logger.warning("Could not poll pending lists from books service.")
+            return
+        self._publish(subscriber.scope, lists)
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "polls": self.polls,
+            "deltas": self.deltas,
+            "dropped": self.dropped,
+        }
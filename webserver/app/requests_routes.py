@@ -1,10 +1,27 @@
 from . import routes_utils as utils
+from .list_query import ListQueryError
+from .pending_feed import (
+    CLOSED,
+    PendingFeedFullError,
+    PendingFeedUnavailableError,
+)
+import queue
+import time
 import requests
 import logging
-from flask import Blueprint, jsonify, current_app, render_template, session
+from flask import Blueprint, jsonify, current_app, session, request
+
+logger = logging.getLogger(__name__)
 
 requests_bp = Blueprint("requests", __name__, url_prefix="/requests")
 
+BULK_ACTIONS = ("approve", "reject")
+BULK_TARGETS = ("books", "reviews")
+
+
+class BulkRequestError(ValueError):
+    """Raised when a bulk moderation payload is invalid."""
+
 
 @requests_bp.before_request
 def update_role():
@@ -15,128 +32,297 @@ def update_role():
 def dashboard():
     username = session.get("username")
     role = session.get("role")
-    return render_template("requests_page.html", username=username, role=role)
+    return utils.render_page("requests_page.html", username=username, role=role)
+
+
+def is_own_item(item, user_id):
+    return (
+        isinstance(item.get("user"), dict) and item["user"].get("keycloakId") == user_id
+    )
 
 
 @requests_bp.route("/books/pending", methods=["GET"])
 def get_pending_books():
     try:
+        query = utils.list_query_from_request()
         books_data = utils.make_authenticated_get_request(
             f"{current_app.config['BOOKS_SERVICE_URL']}/books/pending"
         )
 
         # filter out books that are created by the current user
-        books_data = [
-            item
-            for item in books_data
-            if not (
-                isinstance(item.get("user"), dict)
-                and item["user"].get("keycloakId") == session.get("keycloak_user_id")
-            )
-        ]
-
-        return jsonify(books_data)
+        user_id = session.get("keycloak_user_id")
+        return utils.list_response(
+            books_data, query, exclude=lambda item: is_own_item(item, user_id)
+        )
+    except ListQueryError as e:
+        return jsonify({"error": str(e)}), 400
     except utils.NoPermissionError:
         return (
             jsonify({"error": "You do not have permission to access this resource."}),
             403,
         )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return jsonify({"error": "Error fetching books data."}), 500
 
 
 @requests_bp.route("/reviews/pending", methods=["GET"])
 def get_pending_reviews():
     try:
+        query = utils.list_query_from_request()
         reviews_data = utils.make_authenticated_get_request(
             f"{current_app.config['BOOKS_SERVICE_URL']}/reviews/pending"
         )
 
         # filter out reviews that are created by the current user
-        reviews_data = [
-            item
-            for item in reviews_data
-            if not (
-                isinstance(item.get("user"), dict)
-                and item["user"].get("keycloakId") == session.get("keycloak_user_id")
-            )
-        ]
-
-        return jsonify(reviews_data)
+        user_id = session.get("keycloak_user_id")
+        return utils.list_response(
+            reviews_data, query, exclude=lambda item: is_own_item(item, user_id)
+        )
+    except ListQueryError as e:
+        return jsonify({"error": str(e)}), 400
     except utils.NoPermissionError:
         return (
             jsonify({"error": "You do not have permission to access this resource."}),
             403,
         )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return jsonify({"error": "Error fetching reviews data."}), 500
 
 
+def sse_event(event, data, dumps):
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+def stream_pending_events(feed, subscriber, snapshot, user_id, dumps, config):
+    def visible(items):
+        return [item for item in items if not is_own_item(item, user_id)]
+
+    deadline = time.monotonic() + config["STREAM_MAX_DURATION"]
+    try:
+        yield "retry: 3000\n\n"
+        yield sse_event(
+            "snapshot",
+            {target: visible(items) for target, items in snapshot.items()},
+            dumps,
+        )
+        while time.monotonic() < deadline:
+            try:
+                delta = subscriber.next_event(config["STREAM_KEEPALIVE_INTERVAL"])
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if delta is CLOSED:
+                return
+            yield sse_event("delta", dict(delta, added=visible(delta["added"])), dumps)
+    finally:
+        feed.unsubscribe(subscriber)
+
+
+@requests_bp.route("/stream", methods=["GET"])
+def stream_pending():
+    feed = current_app.extensions["pending_feed"]
+    try:
+        subscriber, snapshot = feed.subscribe(
+            session.get("Authorization"), utils.response_cache_scope()
+        )
+    except utils.NoPermissionError:
+        return (
+            jsonify({"error": "You do not have permission to access this resource."}),
+            403,
+        )
+    except PendingFeedFullError:
+        return jsonify({"error": "Too many open streams, try again later."}), 503
+    except PendingFeedUnavailableError:
+        return jsonify({"error": "Error fetching pending requests."}), 500
+
+    return current_app.response_class(
+        stream_pending_events(
+            feed,
+            subscriber,
+            snapshot,
+            session.get("keycloak_user_id"),
+            current_app.json.dumps,
+            current_app.config,
+        ),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @requests_bp.route("/books/approve/<id>", methods=["GET"])
 def approve_book(id):
     try:
-        response = utils.make_authenticated_get_request(
+        response = utils.make_authenticated_raw_get_request(
             f"{current_app.config['BOOKS_SERVICE_URL']}/books/approve/{id}",
+            idempotent=False,
         )
-        return jsonify(response)
+        utils.invalidate_cached_responses("books_approved")
+        utils.invalidate_book_responses(["book_details"], utils.isbn_of(response))
+        utils.notify_pending_changed()
+        return utils.passthrough_response(response)
     except utils.NoPermissionError:
         return (
             jsonify({"error": "You do not have permission to access this resource."}),
             403,
         )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return jsonify({"error": "Error approving book."}), 500
 
 
 @requests_bp.route("/books/reject/<id>", methods=["GET"])
 def reject_book(id):
     try:
-        response = utils.make_authenticated_get_request(
+        response = utils.make_authenticated_raw_get_request(
             f"{current_app.config['BOOKS_SERVICE_URL']}/books/reject/{id}",
+            idempotent=False,
         )
-        return jsonify(response)
+        utils.invalidate_cached_responses("books_approved")
+        utils.invalidate_book_responses(["book_details"], utils.isbn_of(response))
+        utils.notify_pending_changed()
+        return utils.passthrough_response(response)
     except utils.NoPermissionError:
         return (
             jsonify({"error": "You do not have permission to access this resource."}),
             403,
         )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return jsonify({"error": "Error rejecting book."}), 500
 
 
 @requests_bp.route("/reviews/approve/<id>", methods=["GET"])
 def approve_review(id):
     try:
-        response = utils.make_authenticated_get_request(
+        response = utils.make_authenticated_raw_get_request(
             f"{current_app.config['BOOKS_SERVICE_URL']}/reviews/approve/{id}",
+            idempotent=False,
         )
-        return jsonify(response)
+        utils.invalidate_book_responses(["book_reviews"], utils.isbn_of(response))
+        utils.notify_pending_changed()
+        return utils.passthrough_response(response)
     except utils.NoPermissionError:
         return (
             jsonify({"error": "You do not have permission to access this resource."}),
             403,
         )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return jsonify({"error": "Error approving review."}), 500
 
 
 @requests_bp.route("/reviews/reject/<id>", methods=["GET"])
 def reject_review(id):
     try:
-        response = utils.make_authenticated_get_request(
+        response = utils.make_authenticated_raw_get_request(
             f"{current_app.config['BOOKS_SERVICE_URL']}/reviews/reject/{id}",
+            idempotent=False,
         )
-        return jsonify(response)
+        utils.invalidate_book_responses(["book_reviews"], utils.isbn_of(response))
+        utils.notify_pending_changed()
+        return utils.passthrough_response(response)
     except utils.NoPermissionError:
         return (
             jsonify({"error": "You do not have permission to access this resource."}),
             403,
         )
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return jsonify({"error": "Error rejecting review."}), 500
+
+
+def parse_bulk_request(payload, max_items):
+    if not isinstance(payload, dict):
+        raise BulkRequestError("Expected a JSON object.")
+
+    action = payload.get("action")
+    if action not in BULK_ACTIONS:
+        raise BulkRequestError(f"action must be one of {', '.join(BULK_ACTIONS)}.")
+
+    targets = {}
+    for target in BULK_TARGETS:
+        ids = payload.get(target) or []
+        if not isinstance(ids, list):
+            raise BulkRequestError(f"{target} must be a list of ids.")
+        for item_id in ids:
+            valid_int = isinstance(item_id, int) and not isinstance(item_id, bool)
+            if not (valid_int and item_id >= 0) and not (
+                isinstance(item_id, str) and item_id.isdigit()
+            ):
+                raise BulkRequestError(f"Invalid id in {target}: {item_id!r}.")
+        # Duplicates would only repeat the same upstream call.
+        targets[target] = list(dict.fromkeys(str(item_id) for item_id in ids))
+
+    total = sum(len(ids) for ids in targets.values())
+    if total == 0:
+        raise BulkRequestError("No books or reviews given.")
+    if total > max_items:
+        raise BulkRequestError(f"At most {max_items} items per request.")
+    return action, targets
+
+
+@requests_bp.route("/bulk", methods=["POST"])
+def bulk_moderate():
+    try:
+        action, targets = parse_bulk_request(
+            request.get_json(silent=True) or {}, current_app.config["BULK_MAX_ITEMS"]
+        )
+    except BulkRequestError as e:
+        return jsonify({"error": str(e)}), 400
+
+    books_service_url = current_app.config["BOOKS_SERVICE_URL"]
+    urls = {
+        (target, item_id): f"{books_service_url}/{target}/{action}/{item_id}"
+        for target, ids in targets.items()
+        for item_id in ids
+    }
+    results = utils.fetch_concurrently(
+        urls,
+        session.get("Authorization"),
+        raw=True,
+        max_concurrency=current_app.config["BULK_MAX_CONCURRENCY"],
+        # Approve and reject change state; a retried call may apply twice.
+        idempotent=False,
+    )
+
+    report = []
+    for (target, item_id), result in results.items():
+        entry = {"type": target, "id": item_id}
+        if isinstance(result, utils.NoPermissionError):
+            entry["status"] = 403
+            entry["error"] = f"You do not have permission to {action} {target}."
+        elif isinstance(result, Exception) or result is None:
+            logger.error(
+                "Error during bulk %s of %s %s: %s", action, target, item_id, result
+            )
+            entry["status"] = 502
+            entry["error"] = "Error connecting to books service."
+        elif not result.ok:
+            entry["status"] = result.status_code
+            entry["error"] = f"Books service could not {action} this item."
+        else:
+            entry["status"] = 200
+            if target == "books":
+                utils.invalidate_book_responses(["book_details"], utils.isbn_of(result))
+            else:
+                utils.invalidate_book_responses(["book_reviews"], utils.isbn_of(result))
+        report.append(entry)
+
+    if any(entry["status"] == 200 and entry["type"] == "books" for entry in report):
+        utils.invalidate_cached_responses("books_approved")
+
+    succeeded = sum(1 for entry in report if entry["status"] == 200)
+    if succeeded:
+        utils.notify_pending_changed()
+    body = {
+        "action": action,
+        "succeeded": succeeded,
+        "failed": len(report) - succeeded,
+        "results": report,
+    }
+    statuses = {entry["status"] for entry in report}
+    if 200 in statuses:
+        return jsonify(body)
+    return jsonify(body), 403 if statuses == {403} else 502
@@ -0,0 +1,182 @@
+import logging
+import random
+import threading
+import time
+import requests
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# Statuses that mean the upstream (or the mesh in front of it) is unhealthy,
+# as opposed to the request being wrong.
+FAILURE_STATUSES = frozenset({502, 503, 504})
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` failures in a row the circuit opens and calls
+    fail immediately. Once ``reset_timeout`` seconds have passed a single
+    probe call is let through (half-open): success closes the circuit,
+    failure opens it for another ``reset_timeout``.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self):
+        if self.state == self.CLOSED:
+            return True
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if (
+                self.state == self.OPEN
+                and time.monotonic() - self._opened_at >= self.reset_timeout
+            ):
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, failed):
+        if not failed and self.state == self.CLOSED and not self._failures:
+            return
+        with self._lock:
+            if not failed:
+                if self.state != self.CLOSED:
+                    logger.warning("Circuit for %s closed", self.name)
+                self.state = self.CLOSED
+                self._failures = 0
+                return
+
+            self._failures += 1
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self._failures >= self.failure_threshold
+            ):
+                logger.warning(
+                    "Circuit for %s opened after %s failures",
+                    self.name,
+                    self._failures,
+                )
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.opened += 1
+
+
+class RetryBudget:
+    """Caps retries to a fraction of recent traffic.
+
+    Every first attempt deposits ``ratio`` tokens and every retry withdraws
+    one, so retries can never add more than ``ratio`` extra load. A trickle
+    of ``min_per_second`` tokens keeps retries possible at low traffic.
+    """
+
+    def __init__(self, ratio, min_per_second, max_tokens=100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.exhausted = 0
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.max_tokens,
+                self._tokens + (now - self._updated_at) * self.min_per_second,
+            )
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            self.exhausted += 1
+            return False
+
+
+class UpstreamGuard:
+    """Circuit breaker and budgeted, jittered retries for one upstream.
+
+    Shared by the sync and async clients so both see the same upstream
+    health. Only idempotent methods are retried, on transport errors and
+    gateway statuses, with full-jitter exponential backoff.
+    """
+
+    def __init__(
+        self,
+        breaker,
+        budget,
+        max_retries=2,
+        backoff_base=0.05,
+        backoff_cap=1.0,
+    ):
+        self.breaker = breaker
+        self.budget = budget
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retries = 0
+
+    def acquire(self):
+        """Admit a call; its retries do not need admitting again."""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit for {self.breaker.name} is open")
+        self.budget.deposit()
+
+    @staticmethod
+    def is_failure(error=None, status=None):
+        return error is not None or status in FAILURE_STATUSES
+
+    def record(self, error=None, status=None):
+        """Report the final outcome of a call, after any retries."""
+        failed = self.is_failure(error, status)
+        self.breaker.record(failed)
+        return failed
+
+    def retry_delay(self, method, attempt):
+        """Seconds to wait before retrying, or None if the call must not be retried."""
+        if (
+            method.upper() not in IDEMPOTENT_METHODS
+            or attempt >= self.max_retries
+            or self.breaker.state == CircuitBreaker.OPEN
+            or not self.budget.withdraw()
+        ):
+            return None
+        self.retries += 1
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2**attempt))
+
+    def stats(self):
+        return {
+            "open": int(self.breaker.state == CircuitBreaker.OPEN),
+            "half_open": int(self.breaker.state == CircuitBreaker.HALF_OPEN),
+            "opened": self.breaker.opened,
+            "rejected": self.breaker.rejected,
+            "retries": self.retries,
+            "retry_budget_exhausted": self.budget.exhausted,
+        }
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .http_client import UpstreamBody
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class LruCacheBackend:
+    """In-process backend bounded to ``max_entries`` with LRU eviction."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, etag, stored_at, ttl):
+        with self._lock:
+            self._entries[key] = (value, etag, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Backend shared by every replica. Requires the optional ``redis`` package."""
+
+    def __init__(self, url, namespace="webserver:response:"):
+        if redis is None:
+            raise RuntimeError("The redis package is required for the redis backend")
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+
+    def get(self, key):
+        raw = self.client.get(self.namespace + key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        content, content_type, status_code = entry["value"]
+        value = UpstreamBody(content.encode("latin-1"), content_type, status_code)
+        return value, entry["etag"], entry["stored_at"]
+
+    def set(self, key, value, etag, stored_at, ttl):
+        # latin-1 maps every byte to one code point, so the body survives as is.
+        encoded = [
+            value.content.decode("latin-1"),
+            value.content_type,
+            value.status_code,
+        ]
+        self.client.set(
+            self.namespace + key,
+            json.dumps({"value": encoded, "etag": etag, "stored_at": stored_at}),
+            ex=max(int(ttl), 1),
+        )
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=f"{self.namespace}{prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def size(self):
+        return sum(1 for _ in self.client.scan_iter(match=f"{self.namespace}*"))
+
+
+class ResponseCache:
+    """Read-through cache for upstream GET responses.
+
+    Entries are keyed by route, route argument and permission scope (the
+    caller's role), so users never see data fetched with someone else's
+    permissions. Each route has its own TTL. For ``stale_ttl`` seconds past
+    the TTL an entry is still served while a background refresh runs.
+
+    Values are raw ``UpstreamBody`` objects, so hits can be forwarded to the
+    client without parsing or re-serializing them; only successful responses
+    are stored. Every entry carries a strong ETag computed once from the body
+    bytes when it is stored, so conditional requests are answered for free.
+
+    Invalidation bumps a generation counter for the route or route argument.
+    Loads capture it before calling the upstream and skip the store if it
+    changed meanwhile, so a response fetched before the write it raced with
+    is not cached after it. The counters are per process.
+    """
+
+    FRESH = "fresh"
+    STALE = "stale"
+    MISS = "miss"
+
+    def __init__(self, app, backend, ttls, stale_ttl, refresh_workers=2):
+        self.app = app
+        self.backend = backend
+        self.ttls = ttls
+        self.stale_ttl = stale_ttl
+        self._refreshing = set()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=refresh_workers, thread_name_prefix="response-refresh"
+        )
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(route, key, scope):
+        return f"{route}:{key}:{scope}"
+
+    def is_cached_route(self, route):
+        return route in self.ttls
+
+    @staticmethod
+    def compute_etag(value):
+        return hashlib.sha256(value.content).hexdigest()[:32]
+
+    @staticmethod
+    def is_cacheable(value):
+        return value is not None and value.ok
+
+    def lookup(self, route, key, scope, loader, generation=None):
+        """Return ``(value, etag, state)``; schedules a refresh for stale entries.
+
+        ``generation`` is the one ``loader`` was built for, if any.
+        """
+        cache_key = self.make_key(route, key, scope)
+        ttl = self.ttls[route]
+        entry = self.backend.get(cache_key)
+        if entry is not None:
+            value, etag, stored_at = entry
+            age = time.time() - stored_at
+            if age < ttl:
+                self.hits += 1
+                return value, etag, self.FRESH
+            if age < ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._schedule_refresh(route, key, cache_key, loader, generation)
+                return value, etag, self.STALE
+        self.misses += 1
+        return None, None, self.MISS
+
+    def generation(self, route, key):
+        with self._lock:
+            return (
+                self._generations.get(route, 0),
+                self._generations.get((route, key), 0),
+            )
+
+    def store(self, route, key, scope, value, generation=None):
+        """Cache ``value`` and return its ETag, or None if it was not stored.
+
+        ``generation`` is what ``generation()`` returned before ``value`` was
+        loaded; the value is not stored if the key was invalidated since.
+        """
+        if not self.is_cacheable(value):
+            return None
+        if generation is not None and generation != self.generation(route, key):
+            return None
+        etag = self.compute_etag(value)
+        self.backend.set(
+            self.make_key(route, key, scope),
+            value,
+            etag,
+            time.time(),
+            self.ttls[route] + self.stale_ttl,
+        )
+        return etag
+
+    def get_or_load(self, route, key, scope, loader, generation=None):
+        """Return ``(value, etag)``, loading and storing the value on a miss.
+
+        Callers whose loader depends on the generation (e.g. coalesces calls
+        by it) pass the one they built it for.
+        """
+        if generation is None:
+            generation = self.generation(route, key)
+        value, etag, state = self.lookup(route, key, scope, loader, generation)
+        if state != self.MISS:
+            return value, etag
+        value = loader()
+        return value, self.store(route, key, scope, value, generation)
+
+    def invalidate(self, route, key=None):
+        counter = route if key is None else (route, key)
+        with self._lock:
+            self._generations[counter] = self._generations.get(counter, 0) + 1
+        prefix = f"{route}:" if key is None else f"{route}:{key}:"
+        self.backend.delete_prefix(prefix)
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": self.backend.size(),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
+
+    def _schedule_refresh(self, route, key, cache_key, loader, generation=None):
+        with self._lock:
+            if cache_key in self._refreshing:
+                return
+            self._refreshing.add(cache_key)
+        if generation is None:
+            generation = self.generation(route, key)
+        self._executor.submit(self._refresh, route, key, cache_key, loader, generation)
+
+    def _refresh(self, route, key, cache_key, loader, generation):
+        try:
+            with self.app.app_context():
+                value = loader()
+            if self.is_cacheable(value) and generation == self.generation(route, key):
+                self.backend.set(
+                    cache_key,
+                    value,
+                    self.compute_etag(value),
+                    time.time(),
+                    self.ttls[route] + self.stale_ttl,
+                )
+        except Exception:
+            logger.exception("Background refresh failed for %s", cache_key)
+        finally:
+            with self._lock:
+                self._refreshing.discard(cache_key)
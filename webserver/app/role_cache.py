@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class RoleCache:
+    """Per-user cache of Keycloak client roles.
+
+    Entries younger than ``ttl`` are served as-is. Entries between ``ttl`` and
+    ``ttl + stale_ttl`` are still served, but a background refresh is scheduled
+    so the next request sees up-to-date roles without waiting on Keycloak.
+    Older entries are reloaded synchronously and never served, even when the
+    reload fails: roles decide authorization, so ``ttl + stale_ttl`` bounds
+    how long a revoked role is honoured. The least recently used entry is
+    evicted once ``max_entries`` is reached.
+    """
+
+    def __init__(self, app, loader, ttl, stale_ttl, max_entries, refresh_workers=2):
+        self.app = app
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=refresh_workers, thread_name_prefix="role-refresh"
+        )
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                roles, loaded_at = entry
+                age = now - loaded_at
+                if age < self.ttl:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return roles
+                if age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(user_id)
+                    self.stale_hits += 1
+                    self._schedule_refresh(user_id)
+                    return roles
+            self.misses += 1
+
+        roles = self.loader(user_id)
+        if roles is not None:
+            self.put(user_id, roles)
+        return roles
+
+    def peek(self, user_id):
+        """Cached roles still within ``ttl + stale_ttl``, without loading them."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        roles, loaded_at = entry
+        if time.monotonic() - loaded_at >= self.ttl + self.stale_ttl:
+            return None
+        return roles
+
+    def put(self, user_id, roles):
+        with self._lock:
+            self._entries[user_id] = (roles, time.monotonic())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "size": size,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+        }
+
+    def _schedule_refresh(self, user_id):
+        # Caller holds self._lock.
+        if user_id in self._refreshing:
+            return
+        self._refreshing.add(user_id)
+        self._executor.submit(self._refresh, user_id)
+
+    def _refresh(self, user_id):
+        try:
+            with self.app.app_context():
+                roles = self.loader(user_id)
+            if roles is not None:
+                self.put(user_id, roles)
+        except Exception:
+            logger.exception("Background role refresh failed for %s", user_id)
+        finally:
+            with self._lock:
+                self._refreshing.discard(user_id)
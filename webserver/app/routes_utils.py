@@ -1,6 +1,30 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
 import logging
+import threading
+import jwt
 import requests
-from flask import session, current_app, redirect, url_for
+from flask import (
+    session,
+    current_app,
+    has_request_context,
+    redirect,
+    url_for,
+    g,
+    request,
+    jsonify,
+    render_template,
+)
+from . import json_provider, tracing
+from .compression import matching_etag
+from .http_client import BOOKS_UPSTREAM, KEYCLOAK_UPSTREAM, UpstreamBody
+from .list_query import ListQuery
+from .logging_config import payload_logger
+from .template_cache import url_scope
+
+logger = logging.getLogger(__name__)
 
 
 class NoPermissionError(Exception):
@@ -11,123 +35,488 @@ ISTIO_CLIENT_ID = "Istio"
 ADMIN_CLIENT_CLI_ID = "admin-cli"
 
 
-def make_authenticated_get_request(url):
-    with current_app.app_context():
-        access_token = session.get("Authorization")
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/x-www-form-urlencoded",
-    }
-    try:
-        response = requests.get(url, timeout=5, headers=headers)
-        if response.status_code in [401, 403]:
-            logging.error(
-                f"Failed FETCH request: {response.status_code} {response.text}"
-            )
-            raise NoPermissionError
+def upstream_request(name, method, url, **kwargs):
+    async_client = current_app.extensions.get("async_http_client")
+    if async_client is not None:
+        return async_client.run(async_client.request(name, method, url, **kwargs))
+    return current_app.extensions["http_client"].request(name, method, url, **kwargs)
 
-        if not response.headers.get("Content-Type") == "application/json":
-            return response.text
-        logging.info(f"Response: {response.json()}")
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
-        return None
 
+def books_service_request(method, url, **kwargs):
+    return upstream_request(BOOKS_UPSTREAM, method, url, **kwargs)
 
-def make_authenticated_post_request(url, data):
-    with current_app.app_context():
-        access_token = session.get("Authorization")
-    header = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json",
-    }
 
-    try:
-        response = requests.post(url, headers=header, json=data)
-        if response.status_code in [401, 403]:
-            logging.error(f"Failed POST data: {response.status_code} {response.text}")
-            raise NoPermissionError
-
-        if not response.headers.get("Content-Type") == "application/json":
-            return response.text
-        logging.info(f"Response: {response.json()}")
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+def keycloak_request(method, url, **kwargs):
+    return upstream_request(KEYCLOAK_UPSTREAM, method, url, **kwargs)
+
+
+def authenticated_headers(access_token, data=None):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    if data is None:
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    return headers
+
+
+def parse_books_response(method, response, raw=False):
+    if response.status_code in [401, 403]:
+        payload_logger.error(
+            "Failed %s request: %s %s", method, response.status_code, response.content
+        )
+        raise NoPermissionError
+
+    body = UpstreamBody(
+        response.content,
+        response.headers.get("Content-Type", ""),
+        response.status_code,
+    )
+    payload_logger.debug("Response %s: %s", response.status_code, response.content)
+    if raw:
+        return body
+    return parse_upstream_body(body)
+
+
+def parse_upstream_body(body):
+    if body is None:
         return None
+    if not body.is_json:
+        return body.content.decode("utf-8", errors="replace")
+    return json_provider.loads(body.content)
 
 
-def make_authenticated_delete_request(url):
-    with current_app.app_context():
-        access_token = session.get("Authorization")
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/x-www-form-urlencoded",
-    }
-    try:
-        response = requests.delete(url, timeout=5, headers=headers)
-        if response.status_code in [401, 403]:
-            logging.error(
-                f"Failed DELETE request: {response.status_code} {response.text}"
-            )
-            raise NoPermissionError
+def coalescing_key(method, url, access_token, scope=None, generation=None):
+    """Key under which identical concurrent GETs share one upstream call, or None.
 
-        if not response.headers.get("Content-Type") == "application/json":
-            return response.text
-        logging.info(f"Response: {response.json()}")
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+    Callers with the same permission scope (role) see the same data, as in
+    the response cache; without a known scope only the same token is merged.
+    Response cache loads pass the ``generation`` they will store under, so
+    they never join a call that started before an invalidation.
+    """
+    if method != "GET":
         return None
+    if scope is None:
+        scope = response_cache_scope() if has_request_context() else access_token
+    if generation is not None:
+        return f"{url}|{scope}|{generation}"
+    return f"{url}|{scope}"
 
 
-def make_authenticated_put_request(url, data):
-    with current_app.app_context():
+def make_authenticated_request(
+    method,
+    url,
+    data=None,
+    access_token=None,
+    raw=False,
+    scope=None,
+    idempotent=True,
+    generation=None,
+):
+    """Call the books service with the user's token.
+
+    ``idempotent=False`` marks GETs that change state (approve/reject): they
+    are neither retried nor coalesced with concurrent identical calls.
+    """
+    if access_token is None:
         access_token = session.get("Authorization")
-    header = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json",
-    }
+    headers = authenticated_headers(access_token, data)
+    single_flight = current_app.extensions.get("single_flight")
+    key = (
+        coalescing_key(method, url, access_token, scope, generation)
+        if idempotent
+        else None
+    )
+
+    def fetch():
+        response = books_service_request(
+            method, url, headers=headers, json=data, retry=idempotent
+        )
+        return parse_books_response(method, response, raw=True)
+
     try:
-        response = requests.put(url, headers=header, json=data)
-        if response.status_code in [401, 403]:
-            logging.error(f"Failed PUT request: {response.status_code} {response.text}")
-            raise NoPermissionError
-
-        if not response.headers.get("Content-Type") == "application/json":
-            return response.text
-        logging.info(f"Response: {response.json()}")
-        return response.json()
+        if single_flight is not None and key is not None:
+            body = single_flight.do(key, fetch)
+        else:
+            body = fetch()
+        return body if raw else parse_upstream_body(body)
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error connecting to books service: {e}")
+        logger.error("Error connecting to books service: %s", e)
         return None
 
 
-def get_admin_token():
-    data = {
-        "client_id": ADMIN_CLIENT_CLI_ID,
-        "username": "admin",
-        "password": "admin",
-        "grant_type": "password",
-    }
-    try:
-        response = requests.post(
-            current_app.config["KEYCLOAK_REALM_MASTER_OPENID_TOKEN_URL"],
-            data=data,
-            verify=False,
-            timeout=1,
+async def make_authenticated_request_async(
+    async_client,
+    method,
+    url,
+    access_token,
+    data=None,
+    raw=False,
+    single_flight=None,
+    scope=None,
+    idempotent=True,
+    generation=None,
+):
+    """Coroutine flavour of make_authenticated_request for the upstream loop.
+
+    It runs outside the Flask request context, so the client, the access
+    token, the coalescer and the permission scope have to be captured by the
+    caller.
+    """
+    headers = authenticated_headers(access_token, data)
+    key = (
+        coalescing_key(method, url, access_token, scope or access_token, generation)
+        if idempotent
+        else None
+    )
+
+    async def fetch():
+        response = await async_client.request(
+            BOOKS_UPSTREAM, method, url, headers=headers, json=data, retry=idempotent
         )
-        logging.info("Keycloak response: %s", response.text)
+        return parse_books_response(method, response, raw=True)
 
-        if response.status_code == 200:
-            return response.json().get("access_token")
+    try:
+        if single_flight is not None and key is not None:
+            body = await single_flight.do_async(key, fetch)
         else:
-            logging.error("Invalid credentials")
-            return None
-    except requests.exceptions.RequestException:
-        logging.error("Invalid credentials")
+            body = await fetch()
+        return body if raw else parse_upstream_body(body)
+    except requests.exceptions.RequestException as e:
+        logger.error("Error connecting to books service: %s", e)
+        return None
+
+
+def response_cache_scope():
+    return session.get("role") or "anonymous"
+
+
+def make_cached_get_request(route, key, url):
+    """GET ``url`` through the response cache, returning the raw ``UpstreamBody``."""
+    cache = current_app.extensions.get("response_cache")
+    if cache is None or not cache.is_cached_route(route):
+        return make_authenticated_raw_get_request(url)
+
+    generation = cache.generation(route, key)
+    loader = functools.partial(
+        make_authenticated_request,
+        "GET",
+        url,
+        access_token=session.get("Authorization"),
+        raw=True,
+        scope=response_cache_scope(),
+        generation=generation,
+    )
+    value, g.response_etag = cache.get_or_load(
+        route, key, response_cache_scope(), loader, generation
+    )
+    return value
+
+
+def revalidated_etag(etag):
+    """The form of ``etag`` the request's If-None-Match names, or None.
+
+    Compressed responses carry their encoding's ETag, which only matches
+    while the client would still be sent that encoding.
+    """
+    compressor = current_app.extensions.get("compressor")
+    encoding = compressor.negotiate() if compressor is not None else None
+    return matching_etag(request.if_none_match, etag, encoding)
+
+
+def passthrough_response(body):
+    """Forward an upstream body to the client byte for byte.
+
+    Status and Content-Type are kept, so routes that do not transform the
+    upstream data never parse or re-serialize it.
+    """
+    if body is None:
+        raise requests.exceptions.RequestException("No data from books service")
+    etag = g.get("response_etag")
+    matched = etag and revalidated_etag(etag)
+    if matched:
+        response = current_app.response_class(status=304)
+        response.set_etag(matched)
+        return response
+
+    response = current_app.response_class(
+        body.content,
+        status=body.status_code,
+        content_type=body.content_type or None,
+    )
+    if etag:
+        response.set_etag(etag)
+    return response
+
+
+def conditional_jsonify(data, variant=None):
+    """jsonify ``data``, answering 304 up front when the client already has it.
+
+    Cached routes know the ETag of their payload before serializing it, so a
+    matching If-None-Match skips serialization entirely. ``variant`` names a
+    deterministic transformation of the cached payload (e.g. a query string)
+    and is folded into the ETag. Other JSON responses get their ETag from the
+    after_request hook in create_app().
+    """
+    etag = g.get("response_etag")
+    if etag and variant:
+        etag = hashlib.sha256(f"{etag}:{variant}".encode()).hexdigest()[:32]
+    matched = etag and revalidated_etag(etag)
+    if matched:
+        response = current_app.response_class(status=304)
+        response.set_etag(matched)
+        return response
+
+    response = jsonify(data)
+    if etag:
+        response.set_etag(etag)
+    return response
+
+
+def render_page(template_name, **context):
+    """render_template through the render cache, keyed on the template and its context.
+
+    Pages only depend on what they are given (user name, role, book title and
+    isbn), so the same inputs always produce the same markup.
+    """
+    cache = current_app.extensions.get("render_cache")
+    if cache is None:
+        return render_template(template_name, **context)
+    key = ("page", url_scope(), template_name, *sorted(context.items()))
+    return cache.get_or_render(key, lambda: render_template(template_name, **context))
+
+
+def list_query_from_request():
+    return ListQuery.from_args(request.args, current_app.config["LIST_MAX_LIMIT"])
+
+
+def list_response(items, query, exclude=None):
+    if items is None:
+        raise requests.exceptions.RequestException("No data from books service")
+    if isinstance(items, UpstreamBody):
+        if query.is_identity and exclude is None:
+            return passthrough_response(items)
+        items = parse_upstream_body(items)
+    elif query.is_identity and exclude is None:
+        return conditional_jsonify(items)
+
+    page, next_cursor = query.apply(items, exclude)
+    response = conditional_jsonify(page, variant=request.query_string.decode())
+    if next_cursor:
+        args = dict(request.args.to_dict(), cursor=next_cursor)
+        next_url = url_for(request.endpoint, **request.view_args, **args)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+
+def invalidate_cached_responses(route, key=None):
+    cache = current_app.extensions.get("response_cache")
+    if cache is not None and cache.is_cached_route(route):
+        cache.invalidate(route, key)
+
+
+def invalidate_book_responses(routes, isbn=None):
+    # Without an isbn we cannot tell which book changed, so drop the whole route.
+    for route in routes:
+        invalidate_cached_responses(route, isbn)
+
+
+def isbn_of(item):
+    if isinstance(item, UpstreamBody):
+        # A single book or review is small enough that peeking at it is cheap;
+        # the body itself is still forwarded untouched.
+        item = parse_upstream_body(item) if item.ok else None
+    if not isinstance(item, dict):
         return None
+    if "isbn" in item:
+        return item["isbn"]
+    book = item.get("book")
+    return book.get("isbn") if isinstance(book, dict) else None
+
+
+def fetch_authenticated_concurrently(urls, cache_keys=None):
+    """GET every url in ``urls`` (a name -> url mapping) in parallel.
+
+    ``cache_keys`` optionally maps names to ``(route, key)`` pairs; those parts
+    are served from the response cache when possible and stored on success.
+    Returns a name -> ``UpstreamBody`` mapping where failed calls carry the
+    exception they raised instead, so callers can report partial failures.
+    """
+    access_token = session.get("Authorization")
+    cache = current_app.extensions.get("response_cache")
+    cache_keys = (cache_keys or {}) if cache is not None else {}
+    scope = response_cache_scope()
+
+    results = {}
+    pending = {}
+    generations = {}
+    for name, url in urls.items():
+        if name in cache_keys:
+            route, key = cache_keys[name]
+            generations[name] = cache.generation(route, key)
+            loader = functools.partial(
+                make_authenticated_request,
+                "GET",
+                url,
+                access_token=access_token,
+                raw=True,
+                scope=scope,
+                generation=generations[name],
+            )
+            value, _, state = cache.lookup(route, key, scope, loader, generations[name])
+            if state != cache.MISS:
+                results[name] = value
+                continue
+        pending[name] = url
+
+    fetched = fetch_concurrently(
+        pending, access_token, raw=True, scope=scope, generations=generations
+    )
+    for name, result in fetched.items():
+        if name in cache_keys and not isinstance(result, Exception):
+            route, key = cache_keys[name]
+            cache.store(route, key, scope, result, generations[name])
+    results.update(fetched)
+    return results
+
+
+def fetch_concurrently(
+    urls,
+    access_token,
+    raw=False,
+    scope=None,
+    max_concurrency=None,
+    idempotent=True,
+    generations=None,
+):
+    """GET every url in ``urls`` in parallel, at most ``max_concurrency`` at a time.
+
+    ``idempotent`` and the per-name response cache ``generations`` are passed
+    on to make_authenticated_request.
+    """
+    generations = generations or {}
+    if not urls:
+        return {}
+    scope = scope or response_cache_scope()
+    max_concurrency = max_concurrency or len(urls)
+
+    async_client = current_app.extensions.get("async_http_client")
+    if async_client is not None:
+        single_flight = current_app.extensions.get("single_flight")
+
+        async def gather():
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def fetch_async(name, url):
+                async with semaphore:
+                    return await make_authenticated_request_async(
+                        async_client,
+                        "GET",
+                        url,
+                        access_token,
+                        raw=raw,
+                        single_flight=single_flight,
+                        scope=scope,
+                        idempotent=idempotent,
+                        generation=generations.get(name),
+                    )
+
+            results = await asyncio.gather(
+                *(fetch_async(name, url) for name, url in urls.items()),
+                return_exceptions=True,
+            )
+            return dict(zip(urls, results))
+
+        return async_client.run(gather())
+
+    app = current_app._get_current_object()
+
+    def fetch(name, url):
+        with app.app_context():
+            return make_authenticated_request(
+                "GET",
+                url,
+                access_token=access_token,
+                raw=raw,
+                scope=scope,
+                idempotent=idempotent,
+                generation=generations.get(name),
+            )
+
+    executor = current_app.extensions["fanout_executor"]
+    slots = threading.BoundedSemaphore(max_concurrency)
+    futures = {}
+    for name, url in urls.items():
+        slots.acquire()
+        # Each call runs in a copy of this context, so its spans join the trace.
+        futures[name] = executor.submit(
+            contextvars.copy_context().run, fetch, name, url
+        )
+        futures[name].add_done_callback(lambda _: slots.release())
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            results[name] = e
+    return results
+
+
+def call_concurrently(*calls):
+    """Run zero-argument callables on the fan-out pool and return their results.
+
+    Each call runs in this app context; the first exception raised is re-raised.
+    """
+    app = current_app._get_current_object()
+
+    def call(func):
+        with app.app_context():
+            return func()
+
+    executor = current_app.extensions["fanout_executor"]
+    futures = [
+        executor.submit(contextvars.copy_context().run, call, func) for func in calls
+    ]
+    return [future.result() for future in futures]
+
+
+def fetch_pending_items(app, target, access_token, scope):
+    """GET ``/<target>/pending`` outside of a request, for the pending feed poller."""
+    with app.app_context():
+        return make_authenticated_request(
+            "GET",
+            f"{app.config['BOOKS_SERVICE_URL']}/{target}/pending",
+            access_token=access_token,
+            scope=scope,
+        )
+
+
+def notify_pending_changed():
+    feed = current_app.extensions.get("pending_feed")
+    if feed is not None:
+        feed.notify()
+
+
+def make_authenticated_get_request(url):
+    return make_authenticated_request("GET", url)
+
+
+def make_authenticated_raw_get_request(url, idempotent=True):
+    return make_authenticated_request("GET", url, raw=True, idempotent=idempotent)
+
+
+def make_authenticated_post_request(url, data):
+    return make_authenticated_request("POST", url, data)
+
+
+def make_authenticated_delete_request(url):
+    return make_authenticated_request("DELETE", url)
+
+
+def make_authenticated_put_request(url, data):
+    return make_authenticated_request("PUT", url, data)
+
+
+def get_admin_token():
+    return current_app.extensions["admin_token"].get_token()
 
 
 def get_user_id(admin_token, username):
@@ -136,46 +525,48 @@ def get_user_id(admin_token, username):
     }
     params = {"username": username}
     try:
-        response = requests.get(
+        response = keycloak_request(
+            "GET",
             current_app.config["KEYCLOAK_USERS_URL"],
             headers=headers,
             params=params,
-            verify=False,
-            timeout=1,
         )
-        logging.info("Keycloak response: %s", response.text)
+        payload_logger.debug("Keycloak response: %s", response.content)
 
         if response.status_code == 200:
             return response.json()[0].get("id")
         else:
-            logging.error("User not found")
+            logger.error("User not found")
             return None
     except requests.exceptions.RequestException:
-        logging.error("User not found")
+        logger.error("User not found")
         return None
 
 
 def get_client_id(admin_token):
+    return current_app.extensions["client_registry"].get(admin_token)
+
+
+def fetch_client_id(admin_token):
     headers = {
         "Authorization": f"Bearer {admin_token}",
     }
     params = {"clientId": ISTIO_CLIENT_ID}
     try:
-        response = requests.get(
+        response = keycloak_request(
+            "GET",
             current_app.config["KEYCLOAK_CLIENTS_URL"],
             headers=headers,
             params=params,
-            verify=False,
-            timeout=1,
         )
-        logging.info("Keycloak response: %s", response.text)
+        payload_logger.debug("Keycloak response: %s", response.content)
 
         clients = response.json()
         for client in clients:
             if client.get("clientId") == ISTIO_CLIENT_ID:
                 return client.get("id")
     except requests.exceptions.RequestException:
-        logging.error("Client not found")
+        logger.error("Client not found")
         return None
 
 
@@ -185,59 +576,163 @@ def get_user_roles(admin_token, user_id, client_id):
         "Authorization": f"Bearer {admin_token}",
     }
     try:
-        response = requests.get(
-            roles_url,
-            headers=headers,
-            verify=False,
-            timeout=1,
-        )
-        logging.info("Keycloak response: %s", response.text)
+        response = keycloak_request("GET", roles_url, headers=headers)
+        payload_logger.debug("Keycloak response: %s", response.content)
+
+        if response.status_code == 404:
+            logger.error(
+                "Role mappings not found for user %s and client %s", user_id, client_id
+            )
+            current_app.extensions["client_registry"].verify(admin_token, client_id)
+            return None
         return [role.get("name") for role in response.json()]
     except requests.exceptions.RequestException:
-        logging.error("Roles not found")
+        logger.error("Roles not found")
+        return None
+
+
+def resolve_user_roles(admin_token, user_id):
+    client_id = get_client_id(admin_token)
+    roles = get_user_roles(admin_token, user_id, client_id)
+    if roles is None:
+        # A 404 for a recreated client replaces the pinned id; retry once with it.
+        fresh_client_id = get_client_id(admin_token)
+        if fresh_client_id != client_id:
+            roles = get_user_roles(admin_token, user_id, fresh_client_id)
+    return roles
+
+
+def load_user_roles(user_id):
+    return resolve_user_roles(get_admin_token(), user_id)
+
+
+def get_cached_user_roles(user_id):
+    return current_app.extensions["role_cache"].get(user_id)
+
+
+def get_token_roles(access_token):
+    """Return the client roles carried by a locally verified access token.
+
+    Returns None when local verification is disabled or the token cannot be
+    verified for a reason other than expiry, such as an unknown signing key, so
+    callers can fall back to the Keycloak admin API. Expired tokens raise
+    ``jwt.ExpiredSignatureError``.
+    """
+    verifier = current_app.extensions.get("token_verifier")
+    if verifier is None:
+        return None
+    try:
+        return verifier.roles(verifier.verify(access_token))
+    except jwt.ExpiredSignatureError:
+        raise
+    except jwt.PyJWTError as e:
+        # Includes unknown signing keys, e.g. right after a key rotation or
+        # while the JWKS endpoint is down.
+        logger.warning("Local token verification failed: %s", e)
+        return None
+
+
+def token_subject(access_token):
+    try:
+        return jwt.decode(access_token, options={"verify_signature": False}).get("sub")
+    except jwt.PyJWTError:
         return None
 
 
+@tracing.traced("resolve_login_identity")
+def resolve_login_identity(access_token, username):
+    """Return ``(user_id, roles)`` for a user who was just issued ``access_token``.
+
+    A locally verified token carries both, so login costs no admin API call.
+    Otherwise the user id is still read from the token, which came straight
+    from Keycloak's token endpoint; only the roles need the admin API, with
+    the cached admin token and pinned client id. Tokens without a subject
+    fall back to a username lookup, run alongside the client id lookup.
+    """
+    verifier = current_app.extensions.get("token_verifier")
+    if verifier is not None:
+        try:
+            claims = verifier.verify(access_token)
+            return claims["sub"], verifier.roles(claims)
+        except jwt.PyJWTError as e:
+            logger.warning("Local token verification failed at login: %s", e)
+
+    admin_token = get_admin_token()
+    user_id = token_subject(access_token)
+    if user_id is None:
+        user_id, _ = call_concurrently(
+            functools.partial(get_user_id, admin_token, username),
+            functools.partial(get_client_id, admin_token),
+        )
+    return user_id, resolve_user_roles(admin_token, user_id)
+
+
+def refresh_session_tokens():
+    refresh_token = session.get("refresh_token")
+    if not refresh_token:
+        logger.warning("Refresh token is missing. Clearing session.")
+        return False
+
+    data = {
+        "client_id": ISTIO_CLIENT_ID,
+        "grant_type": "refresh_token",
+        "refresh_token": refresh_token,
+    }
+    response = keycloak_request(
+        "POST",
+        current_app.config["KEYCLOAK_REALM_ISTIO_OPENID_TOKEN_URL"],
+        data=data,
+    )
+    if response.status_code != 200:
+        logger.error("Failed to refresh access token.")
+        return False
+
+    token_data = response.json()
+    session["Authorization"] = token_data["access_token"]
+    session["refresh_token"] = token_data["refresh_token"]
+    return True
+
+
+@tracing.traced("update_role")
 def update_role():
     with current_app.app_context():
         try:
-            if session.get("Authorization"):
-                admin_token = get_admin_token()
-                user_id = session.get("keycloak_user_id")
-                client_id = get_client_id(admin_token)
-
-                updated_roles = get_user_roles(admin_token, user_id, client_id)
-                new_role = "-".join(updated_roles)
-                logging.info("Roles: %s -> %s", session.get("role"), new_role)
+            access_token = session.get("Authorization")
+            if not access_token:
+                return
+
+            try:
+                token_roles = get_token_roles(access_token)
+            except jwt.ExpiredSignatureError:
+                logger.info("Access token expired, refreshing.")
+                if not refresh_session_tokens():
+                    session.clear()
+                    return redirect(url_for("auth.login"))
+                token_roles = get_token_roles(session["Authorization"])
+
+            if token_roles is not None:
+                # The token is authoritative for its own roles, no refresh needed.
+                new_role = "-".join(token_roles)
                 if new_role != session.get("role"):
-                    refresh_token = session.get("refresh_token")
-                    if refresh_token:
-                        data = {
-                            "client_id": ISTIO_CLIENT_ID,
-                            "grant_type": "refresh_token",
-                            "refresh_token": refresh_token,
-                        }
-                        response = requests.post(
-                            current_app.config["KEYCLOAK_REALM_ISTIO_OPENID_TOKEN_URL"],
-                            data=data,
-                            verify=False,
-                            timeout=1,
-                        )
-                        if response.status_code == 200:
-                            token_data = response.json()
-                            session["Authorization"] = token_data["access_token"]
-                            session["refresh_token"] = token_data["refresh_token"]
-                            session["role"] = new_role
-                            logging.info("Access token refreshed, and role updated.")
-                        else:
-                            logging.error("Failed to refresh access token.")
-                            session.clear()
-                            return redirect(url_for("auth.login"))
-                    else:
-                        logging.warning("Refresh token is missing. Clearing session.")
-                        session.clear()
-                        return redirect(url_for("auth.login"))
+                    logger.info("Roles: %s -> %s", session.get("role"), new_role)
+                    session["role"] = new_role
+                return
+
+            user_id = session.get("keycloak_user_id")
+            updated_roles = get_cached_user_roles(user_id)
+            if updated_roles is None:
+                logger.error("Could not resolve roles for user %s", user_id)
+                return
+            new_role = "-".join(updated_roles)
+            logger.info("Roles: %s -> %s", session.get("role"), new_role)
+            if new_role != session.get("role"):
+                if refresh_session_tokens():
+                    session["role"] = new_role
+                    logger.info("Access token refreshed, and role updated.")
+                else:
+                    session.clear()
+                    return redirect(url_for("auth.login"))
         except requests.exceptions.RequestException as e:
-            logging.error("Error during role update or token refresh: %s", str(e))
+            logger.error("Error during role update or token refresh: %s", str(e))
             session.clear()
             return redirect(url_for("auth.login"))
@@ -0,0 +1,199 @@
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from flask import request
+from flask.sessions import (
+    SecureCookieSession,
+    SecureCookieSessionInterface,
+    SessionInterface,
+)
+from itsdangerous import BadSignature, Signer
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class MemorySessionStore:
+    """Per-process session store with TTL expiry and LRU eviction.
+
+    Every write or touch moves a session to the end with the same TTL, so
+    the oldest entries are always at the front and expired ones can be
+    dropped from there without scanning the whole store.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[sid]
+                return None
+            return dict(data)
+
+    def set(self, sid, data, ttl):
+        with self._lock:
+            self._entries[sid] = (dict(data), time.time() + ttl)
+            self._entries.move_to_end(sid)
+            self._evict()
+
+    def touch(self, sid, ttl):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is not None:
+                self._entries[sid] = (entry[0], time.time() + ttl)
+                self._entries.move_to_end(sid)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def size(self):
+        return len(self._entries)
+
+    def _evict(self):
+        now = time.time()
+        while self._entries:
+            sid, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[sid]
+
+
+class RedisSessionStore:
+    """Session store shared by every replica. Requires the optional ``redis`` package."""
+
+    def __init__(self, url, namespace="webserver:session:"):
+        if redis is None:
+            raise RuntimeError("The redis package is required for the redis store")
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+
+    def get(self, sid):
+        raw = self.client.get(self.namespace + sid)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, sid, data, ttl):
+        self.client.set(self.namespace + sid, json.dumps(data), ex=max(int(ttl), 1))
+
+    def touch(self, sid, ttl):
+        self.client.expire(self.namespace + sid, max(int(ttl), 1))
+
+    def delete(self, sid):
+        self.client.delete(self.namespace + sid)
+
+    def size(self):
+        return sum(1 for _ in self.client.scan_iter(match=f"{self.namespace}*"))
+
+
+def is_static_request():
+    # Static responses are shared by caches, so they must neither refresh the
+    # session cookie nor vary on it.
+    return request.endpoint == "static"
+
+
+class CookieSessionInterface(SecureCookieSessionInterface):
+    """Flask's signed cookie sessions, left out of static responses."""
+
+    def save_session(self, app, session, response):
+        if is_static_request():
+            return
+        super().save_session(app, session, response)
+
+
+class ServerSideSession(SecureCookieSession):
+    def __init__(self, initial=None, sid=None):
+        super().__init__(initial)
+        self.sid = sid
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps session data in a store and only a signed, opaque id in the cookie.
+
+    Unknown or expired ids are never adopted: the client gets a fresh id the
+    next time the session is written, which also rules out session fixation.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def get_signer(self, app):
+        if not app.secret_key:
+            return None
+        return Signer(app.secret_key, salt="session-id")
+
+    def open_session(self, app, request):
+        signer = self.get_signer(app)
+        if signer is None:
+            return None
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = signer.unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            data = self.store.get(sid) if sid else None
+            if data is not None:
+                return ServerSideSession(data, sid=sid)
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        if is_static_request():
+            return
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        # session.permanent alone is not worth a store entry for anonymous visitors.
+        if not any(key != "_permanent" for key in session):
+            if session.modified and session.sid:
+                self.store.delete(session.sid)
+                response.delete_cookie(
+                    name,
+                    domain=domain,
+                    path=path,
+                    secure=secure,
+                    samesite=samesite,
+                    httponly=httponly,
+                )
+                response.vary.add("Cookie")
+            return
+
+        ttl = app.permanent_session_lifetime.total_seconds()
+        if session.modified or not session.sid:
+            if not session.sid:
+                session.sid = secrets.token_urlsafe(32)
+            self.store.set(session.sid, dict(session), ttl)
+        elif self.should_set_cookie(app, session):
+            self.store.touch(session.sid, ttl)
+        else:
+            return
+
+        response.set_cookie(
+            name,
+            self.get_signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite,
+        )
+        response.vary.add("Cookie")
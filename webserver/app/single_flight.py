@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key (the leader) runs the call; callers arriving
+    while it is in flight wait and receive the same result or exception.
+    Nothing is kept once the call completes, so this only merges calls that
+    actually overlap. ``do`` serves threads, ``do_async`` coroutines on one
+    event loop; the two keep separate in-flight tables.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            self.followers += 1
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        self.leaders += 1
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def do_async(self, key, coro_func):
+        future = self._async_calls.get(key)
+        if future is not None:
+            self.followers += 1
+            return await asyncio.shield(future)
+
+        self.leaders += 1
+        future = asyncio.get_running_loop().create_future()
+        self._async_calls[key] = future
+        try:
+            result = await coro_func()
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved, so a call nobody else waited for is not reported.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._async_calls[key]
+
+    def stats(self):
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "in_flight": len(self._calls) + len(self._async_calls),
+        }
@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+from flask import has_request_context, request
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+
+class RenderCache:
+    """Rendered pages and fragments, bounded to ``max_chars`` with LRU eviction.
+
+    Keys are tuples of everything the markup depends on, so entries are
+    never stale while the templates themselves do not change.
+    """
+
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_chars:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def get_or_render(self, key, render):
+        value = self.get(key)
+        if value is None:
+            value = render()
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "chars": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def url_scope():
+    # Rendered URLs are relative to the mount point, which a proxy may vary.
+    return request.script_root if has_request_context() else ""
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache "name", var, ... %}...{% endcache %}`` caches the enclosed markup.
+
+    The fragment is keyed on its name and the listed values, which must be
+    every variable the block reads. Without ``environment.render_cache`` set
+    the block is rendered as usual.
+    """
+
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(render_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_render_fragment", [nodes.List(key)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_fragment(self, key, caller):
+        cache = self.environment.render_cache
+        if cache is None:
+            return caller()
+        return cache.get_or_render(("fragment", url_scope(), *key), caller)
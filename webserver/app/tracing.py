@@ -0,0 +1,306 @@
+import contextvars
+import functools
+import json
+import logging
+import queue
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+import requests
+
+logger = logging.getLogger(__name__)
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = (
+        "trace",
+        "name",
+        "span_id",
+        "parent_id",
+        "kind",
+        "start",
+        "end",
+        "attributes",
+        "_started",
+        "_elapsed",
+    )
+
+    def __init__(self, trace, name, parent_id, kind="internal", attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.end = None
+        self._started = time.perf_counter()
+        self._elapsed = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self):
+        if self._elapsed is None:
+            self._elapsed = time.perf_counter() - self._started
+            self.end = self.start + self._elapsed
+            self.trace.spans.append(self)
+
+    @property
+    def duration_ms(self):
+        elapsed = self._elapsed
+        if elapsed is None:
+            elapsed = time.perf_counter() - self._started
+        return elapsed * 1000
+
+    @property
+    def traceparent(self):
+        flags = "01" if self.trace.sampled else "00"
+        return f"00-{self.trace.trace_id}-{self.span_id}-{flags}"
+
+    def to_dict(self):
+        return {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "durationMs": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    def set(self, key, value):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """The spans recorded while handling one request, in completion order."""
+
+    def __init__(self, trace_id, sampled):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans = []
+
+
+def parse_traceparent(header):
+    """Return ``(trace_id, parent_id, sampled)`` from a W3C traceparent, or None."""
+    match = _TRACEPARENT.match((header or "").strip().lower())
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def span(name, kind="internal", **attributes):
+    """Time the block as a child of the current span; a no-op outside a trace."""
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+
+    child = Span(parent.trace, name, parent.span_id, kind, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        _current_span.reset(token)
+        child.finish()
+
+
+def traced(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def inject(headers=None):
+    """Return ``headers`` plus the traceparent of the current span, if any."""
+    active = _current_span.get()
+    if active is None:
+        return headers
+    headers = dict(headers or {})
+    headers["traceparent"] = active.traceparent
+    return headers
+
+
+def server_timing(root, limit=20):
+    """Render a Server-Timing header value from the spans recorded under ``root``.
+
+    Only span names and durations are sent: the ``desc`` attributes name
+    upstream paths and user ids, which stay in the exported spans.
+    """
+    entries = [
+        f"{recorded.name};dur={recorded.duration_ms:.1f}"
+        for recorded in root.trace.spans[:limit]
+        if recorded is not root
+    ]
+    entries.append(f"total;dur={root.duration_ms:.1f}")
+    return ", ".join(entries)
+
+
+class Tracer:
+    """Starts and finishes the root span of each request.
+
+    An incoming W3C ``traceparent`` is continued, including its sampling
+    decision; otherwise a new trace is sampled at ``sample_rate``. Finished
+    sampled traces are handed to the exporter.
+    """
+
+    def __init__(self, exporter=None, sample_rate=1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def start(self, name, traceparent=None, **attributes):
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+            sampled = random.random() < self.sample_rate
+        root = Span(Trace(trace_id, sampled), name, parent_id, "server", attributes)
+        return root, _current_span.set(root)
+
+    def finish(self, root, token):
+        _current_span.reset(token)
+        root.finish()
+        if self.exporter is not None and root.trace.sampled:
+            self.exporter.export(root.trace.spans)
+
+
+class StdoutSpanExporter:
+    """Writes one JSON object per span to stdout. Meant for local testing."""
+
+    def write(self, spans):
+        for finished in spans:
+            sys.stdout.write(json.dumps(finished.to_dict(), default=str) + "\n")
+        sys.stdout.flush()
+
+
+class FileSpanExporter:
+    """Appends one JSON object per span to ``path``. Meant for local testing."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, spans):
+        with open(self.path, "a") as file:
+            for finished in spans:
+                file.write(json.dumps(finished.to_dict(), default=str) + "\n")
+
+
+class OtlpHttpSpanExporter:
+    """Posts spans to an OpenTelemetry collector using OTLP/HTTP with JSON encoding."""
+
+    KINDS = {"internal": 1, "server": 2, "client": 3}
+
+    def __init__(self, endpoint, service_name, timeout=2):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+        self.http = requests.Session()
+
+    def write(self, spans):
+        payload = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            self._attribute("service.name", self.service_name)
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": self.service_name},
+                            "spans": [self._span(finished) for finished in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        response = self.http.post(self.endpoint, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+
+    def _span(self, finished):
+        otlp_span = {
+            "traceId": finished.trace.trace_id,
+            "spanId": finished.span_id,
+            "name": finished.name,
+            "kind": self.KINDS[finished.kind],
+            "startTimeUnixNano": str(int(finished.start * 1e9)),
+            "endTimeUnixNano": str(int(finished.end * 1e9)),
+            "attributes": [
+                self._attribute(key, value)
+                for key, value in finished.attributes.items()
+            ],
+        }
+        if finished.parent_id:
+            otlp_span["parentSpanId"] = finished.parent_id
+        return otlp_span
+
+    @staticmethod
+    def _attribute(key, value):
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class BatchSpanExporter:
+    """Queues finished traces and writes them from a background thread.
+
+    Requests never wait on the exporter; when the queue is full, traces are
+    dropped and counted.
+    """
+
+    def __init__(self, writer, max_queue=2048, max_batch=256):
+        self.writer = writer
+        self.max_batch = max_batch
+        self.dropped = 0
+        self._queue = queue.Queue(max_queue)
+        self._thread = threading.Thread(
+            target=self._run, name="span-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def export(self, spans):
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = list(self._queue.get())
+            while len(batch) < self.max_batch:
+                try:
+                    batch.extend(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.writer.write(batch)
+            except Exception as e:
+                logger.warning("Span export failed: %s", e)
+
+    def stats(self):
+        return {"queued": self._queue.qsize(), "dropped": self.dropped}
@@ -0,0 +1,32 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from manage import app as wsgi_app
+
+# Each in-flight request holds one of these threads for its whole duration,
+# including while it waits on upstream I/O multiplexed on the event loop.
+wsgi_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ASGI_THREADS", "256")), thread_name_prefix="asgi"
+)
+
+
+class ThreadPoolWsgiToAsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs every WSGI call on one shared thread by default, which
+    # serializes requests and breaks under concurrent keep-alive traffic.
+    # Run them on the ASGI_THREADS pool instead.
+    run_wsgi_app = sync_to_async(
+        WsgiToAsgiInstance.__dict__["run_wsgi_app"].func,
+        thread_sensitive=False,
+        executor=wsgi_executor,
+    )
+
+
+class ThreadPoolWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await ThreadPoolWsgiToAsgiInstance(
+            self.wsgi_application, self.duplicate_header_limit
+        )(scope, receive, send)
+
+
+app = ThreadPoolWsgiToAsgi(wsgi_app)
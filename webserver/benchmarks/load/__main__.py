@@ -0,0 +1,158 @@
+"""Command line entry point: ``python -m benchmarks.load {run,compare}``.
+
+Run from the ``webserver`` directory.
+"""
+
+import argparse
+import os
+import sys
+from ..metadata import default_result_path, run_metadata
+from . import report
+from .runner import SERVERS, Stack, run_load
+from .scenarios import DEFAULT_MIX, Catalogue, parse_mix
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def parse_env(pairs):
+    env = {}
+    for pair in pairs:
+        name, separator, value = pair.partition("=")
+        if not separator:
+            raise argparse.ArgumentTypeError(f"Expected NAME=VALUE, got {pair!r}")
+        env[name] = value
+    return env
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Start the stack and measure it.")
+    run.add_argument("--users", type=int, default=16, help="Concurrent virtual users.")
+    run.add_argument("--duration", type=float, default=30, help="Measured seconds.")
+    run.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds.")
+    run.add_argument(
+        "--mix",
+        default=DEFAULT_MIX,
+        help=f"Scenario weights as name=weight pairs (default: {DEFAULT_MIX}).",
+    )
+    run.add_argument("--server", choices=SERVERS, default="werkzeug")
+    run.add_argument(
+        "--threads", type=int, default=16, help="gunicorn threads per worker."
+    )
+    run.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="Webserver setting to override; repeatable.",
+    )
+    run.add_argument("--seed", type=int, default=1)
+
+    data = run.add_argument_group("fake books service data")
+    data.add_argument("--books", type=int, default=200)
+    data.add_argument("--reviews-per-book", type=int, default=5)
+    data.add_argument("--pending-ratio", type=float, default=0.1)
+    data.add_argument("--token-ttl", type=int, default=300)
+
+    faults = run.add_argument_group("latency and error injection (seconds, fractions)")
+    for upstream, latency in (("keycloak", 0.005), ("books", 0.01)):
+        faults.add_argument(f"--{upstream}-latency", type=float, default=latency)
+        faults.add_argument(f"--{upstream}-jitter", type=float, default=latency / 2)
+        faults.add_argument(f"--{upstream}-error-rate", type=float, default=0.0)
+
+    run.add_argument(
+        "--output",
+        help="Where to write the JSON results (default: results/<time>-<commit>.json).",
+    )
+    run.add_argument("--baseline", help="Result file to compare this run against.")
+    run.add_argument("--threshold", type=float, default=0.1)
+
+    compare = commands.add_parser("compare", help="Compare two result files.")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.1)
+    return parser
+
+
+def print_comparison(baseline, current, threshold):
+    lines, regressions = report.compare_results(baseline, current, threshold)
+    print("\n".join(lines))
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {threshold:.0%}.")
+    return 1 if regressions else 0
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    env = parse_env(args.env)
+    settings = {
+        "books": args.books,
+        "reviews_per_book": args.reviews_per_book,
+        "pending_ratio": args.pending_ratio,
+        "token_ttl": args.token_ttl,
+        "keycloak_latency": args.keycloak_latency,
+        "keycloak_jitter": args.keycloak_jitter,
+        "keycloak_error_rate": args.keycloak_error_rate,
+        "books_latency": args.books_latency,
+        "books_jitter": args.books_jitter,
+        "books_error_rate": args.books_error_rate,
+    }
+    catalogue = Catalogue(args.books, args.pending_ratio)
+
+    with Stack(settings, args.server, args.threads, env) as stack:
+        print(
+            f"Running {args.users} users for {args.duration:g}s "
+            f"against {stack.app_url} ({args.server})..."
+        )
+        samples, elapsed = run_load(
+            stack.app_url,
+            mix,
+            catalogue,
+            users=args.users,
+            duration=args.duration,
+            warmup=args.warmup,
+            seed=args.seed,
+        )
+
+    options = dict(
+        settings,
+        users=args.users,
+        duration=args.duration,
+        warmup=args.warmup,
+        mix=mix,
+        server=args.server,
+        threads=args.threads,
+        env=env,
+        seed=args.seed,
+    )
+    results = report.build_results(samples, elapsed, run_metadata(options))
+    print(report.format_table(results))
+
+    output = args.output
+    if output is None:
+        output = default_result_path(RESULTS_DIR, results["meta"]["commit"])
+    report.save_results(results, output)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        return print_comparison(
+            report.load_results(args.baseline), results, args.threshold
+        )
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "compare":
+        return print_comparison(
+            report.load_results(args.baseline),
+            report.load_results(args.current),
+            args.threshold,
+        )
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
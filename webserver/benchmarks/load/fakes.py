@@ -0,0 +1,380 @@
+"""Local stand-ins for Keycloak and the books service.
+
+They implement only the endpoints the webserver calls, with the same paths
+and response shapes, and can add latency and errors to every response.
+"""
+
+import json
+import random
+import re
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+REALM = "Istio"
+CLIENT_ID = "Istio"
+CLIENT_UUID = "0b3c2f6e-istio-client"
+VERIFIED_ROLES = ("user", "verified")
+
+
+class FaultInjector:
+    """Delays responses and turns a fraction of them into errors.
+
+    Latency is drawn uniformly from ``latency`` +/- ``jitter`` seconds.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.injected_errors = 0
+
+    def apply(self):
+        """Sleep, then return an error response or None."""
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            self.injected_errors += 1
+            return json_response(
+                {"error": "injected failure"}, status=self.error_status
+            )
+        return None
+
+
+def json_response(data, status=200):
+    return Response(json.dumps(data), status, content_type="application/json")
+
+
+class FakeService:
+    """A WSGI app that dispatches on ``(method, path regex)`` routes."""
+
+    def __init__(self, faults=None):
+        self.faults = faults or FaultInjector()
+        self.requests = 0
+        self._routes = []
+
+    def route(self, method, pattern, handler):
+        self._routes.append((method, re.compile(f"^{pattern}$"), handler))
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        self.requests += 1
+        response = self.faults.apply() or self.dispatch(request)
+        return response(environ, start_response)
+
+    def dispatch(self, request):
+        for method, pattern, handler in self._routes:
+            match = pattern.match(request.path)
+            if match and request.method == method:
+                return handler(request, *match.groups())
+        return json_response({"error": "Not found"}, status=404)
+
+
+class FakeKeycloak(FakeService):
+    """Token, JWKS, logout and admin (users, clients, role mappings) endpoints.
+
+    Every password is accepted. Usernames starting with ``unverified`` get
+    the ``user`` role only, everyone else ``user`` and ``verified``. Tokens are
+    issued for the host they were requested from, which is what the
+    webserver expects as issuer.
+    """
+
+    def __init__(self, token_ttl=300, faults=None):
+        super().__init__(faults)
+        self.token_ttl = token_ttl
+        self.key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.kid = secrets.token_hex(4)
+        jwk = json.loads(RSAAlgorithm.to_jwk(self.key.public_key()))
+        jwk.update(kid=self.kid, alg="RS256", use="sig")
+        self.jwks = {"keys": [jwk]}
+
+        openid = r"/realms/(\w+)/protocol/openid-connect"
+        admin = f"/admin/realms/{REALM}"
+        self.route("POST", f"{openid}/token", self.token)
+        self.route("POST", f"{openid}/logout", self.logout)
+        self.route("GET", f"{openid}/certs", self.certs)
+        self.route("GET", f"{admin}/users", self.find_users)
+        self.route("GET", f"{admin}/clients", self.find_clients)
+        self.route(
+            "GET", f"{admin}/users/([^/]+)/role-mappings/clients/([^/]+)", self.roles
+        )
+
+    @staticmethod
+    def user_id(username):
+        return f"kc-{username}"
+
+    @staticmethod
+    def roles_of(username):
+        if username.startswith("unverified"):
+            return ["user"]
+        return list(VERIFIED_ROLES)
+
+    def mint(self, request, username):
+        now = int(time.time())
+        claims = {
+            "iss": f"{request.host_url.rstrip('/')}/realms/{REALM}",
+            "sub": self.user_id(username),
+            "azp": CLIENT_ID,
+            "iat": now,
+            "exp": now + self.token_ttl,
+            "preferred_username": username,
+            "resource_access": {CLIENT_ID: {"roles": self.roles_of(username)}},
+        }
+        return jwt.encode(
+            claims, self.key, algorithm="RS256", headers={"kid": self.kid}
+        )
+
+    def token(self, request, realm):
+        form = request.form
+        grant_type = form.get("grant_type")
+        if grant_type == "password":
+            username = form.get("username")
+        elif grant_type == "refresh_token":
+            username = form.get("refresh_token", "").partition(":")[2]
+        elif grant_type == "client_credentials":
+            username = form.get("client_id")
+        else:
+            return json_response({"error": "unsupported_grant_type"}, status=400)
+        if not username:
+            return json_response({"error": "invalid_grant"}, status=401)
+        return json_response(
+            {
+                "access_token": self.mint(request, username),
+                "expires_in": self.token_ttl,
+                "refresh_token": f"refresh:{username}",
+                "refresh_expires_in": self.token_ttl * 6,
+                "token_type": "Bearer",
+            }
+        )
+
+    def logout(self, request, realm):
+        return Response(status=204)
+
+    def certs(self, request, realm):
+        return json_response(self.jwks)
+
+    def find_users(self, request):
+        username = request.args.get("username", "")
+        return json_response([{"id": self.user_id(username), "username": username}])
+
+    def find_clients(self, request):
+        return json_response([{"id": CLIENT_UUID, "clientId": CLIENT_ID}])
+
+    def roles(self, request, user_id, client_uuid):
+        if client_uuid != CLIENT_UUID:
+            return json_response({"error": "Client not found"}, status=404)
+        username = user_id.removeprefix("kc-")
+        return json_response([{"name": role} for role in self.roles_of(username)])
+
+
+class FakeBooksService(FakeService):
+    """The books-service ``/books`` and ``/reviews`` APIs over a synthetic catalogue.
+
+    Moderation calls answer like the real service but do not change the
+    data, so every run sees the same catalogue. As in the mesh, everything
+    but the public book lookups needs the caller's token, and reviews,
+    moderation and changes need the ``verified`` role.
+    """
+
+    def __init__(
+        self, book_count=200, reviews_per_book=5, pending_ratio=0.1, faults=None
+    ):
+        super().__init__(faults)
+        self.books = [self.make_book(i) for i in range(1, book_count + 1)]
+        for book in self.books:
+            is_pending = is_pending_book(book["bookId"], pending_ratio)
+            book["status"] = "PENDING" if is_pending else "APPROVED"
+        self.by_isbn = {book["isbn"]: book for book in self.books}
+        self.by_id = {book["bookId"]: book for book in self.books}
+        self.reviews = []
+        for book in self.books:
+            for n in range(reviews_per_book):
+                self.reviews.append(self.make_review(len(self.reviews) + 1, book, n))
+        self.reviews_by_isbn = {}
+        for review in self.reviews:
+            self.reviews_by_isbn.setdefault(review["book"]["isbn"], []).append(review)
+        self.review_by_id = {review["reviewId"]: review for review in self.reviews}
+
+        self.route("GET", "/books/approved", self.books_with_status("APPROVED"))
+        self.route("GET", "/books/pending", self.books_with_status("PENDING"))
+        self.route("GET", "/books/title/([^/]+)", self.title)
+        self.route("GET", "/books/ratings/([^/]+)", self.ratings)
+        self.route("GET", r"/books/(approve|reject)/(\d+)", self.moderate_book)
+        self.route("POST", "/books/add", self.add)
+        self.route("DELETE", r"/books/delete/(\d+)", self.delete("book"))
+        self.route("GET", "/books/([^/]+)", self.book)
+        self.route("GET", "/reviews/pending", self.reviews_with_status("PENDING"))
+        self.route("GET", "/reviews/by-isbn/approved/([^/]+)", self.approved_reviews)
+        self.route("GET", r"/reviews/(approve|reject)/(\d+)", self.moderate_review)
+        self.route("POST", "/reviews/add", self.add)
+        self.route("DELETE", r"/reviews/delete/(\d+)", self.delete("review"))
+
+    @staticmethod
+    def make_book(book_id):
+        published = datetime(1950, 1, 1) + timedelta(days=book_id * 97 % 25000)
+        return {
+            "bookId": book_id,
+            "title": f"Book {book_id}",
+            "author": f"Author {book_id % 37}",
+            "genre": ("Fiction", "Science", "History", "Poetry")[book_id % 4],
+            "publicationDate": published.date().isoformat(),
+            "isbn": isbn_of(book_id),
+            "description": f"Description of book {book_id}. " * 4,
+        }
+
+    @staticmethod
+    def make_review(review_id, book, n):
+        user_number = (review_id * 7) % 50
+        return {
+            "reviewId": review_id,
+            "book": {key: book[key] for key in ("bookId", "title", "isbn")},
+            "user": {
+                "userId": user_number,
+                "username": f"reader{user_number}",
+                "email": f"reader{user_number}@example.com",
+                "keycloakId": f"kc-reader{user_number}",
+                "registeredAt": "2024-01-01T00:00:00.000+00:00",
+            },
+            "reviewText": f"Review {n} of {book['title']}.",
+            "reviewDate": (
+                datetime(2024, 1, 1) + timedelta(minutes=review_id * 13)
+            ).isoformat(),
+            "status": "PENDING" if review_id % 10 == 0 else "APPROVED",
+        }
+
+    @staticmethod
+    def token_roles(request):
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme != "Bearer" or not token:
+            return None
+        try:
+            claims = jwt.decode(token, options={"verify_signature": False})
+        except jwt.InvalidTokenError:
+            return None
+        return claims.get("resource_access", {}).get(CLIENT_ID, {}).get("roles", [])
+
+    def forbidden(self, request, required=VERIFIED_ROLES):
+        roles = self.token_roles(request)
+        if roles is None or not set(required) <= set(roles):
+            return Response("RBAC: access denied", 403, content_type="text/plain")
+        return None
+
+    def books_with_status(self, status):
+        def handler(request):
+            if status != "APPROVED" and (denied := self.forbidden(request)):
+                return denied
+            return json_response(
+                [book for book in self.books if book["status"] == status]
+            )
+
+        return handler
+
+    def reviews_with_status(self, status):
+        def handler(request):
+            if denied := self.forbidden(request):
+                return denied
+            return json_response(
+                [review for review in self.reviews if review["status"] == status]
+            )
+
+        return handler
+
+    def book(self, request, isbn):
+        if denied := self.forbidden(request, ("user",)):
+            return denied
+        book = self.by_isbn.get(isbn)
+        if book is None:
+            return json_response({"error": "Book not found"}, status=404)
+        return json_response(book)
+
+    def title(self, request, isbn):
+        book = self.by_isbn.get(isbn)
+        if book is None:
+            return json_response({"error": "Book not found"}, status=404)
+        return json_response({str(book["bookId"]): book["title"]})
+
+    def ratings(self, request, isbn):
+        book = self.by_isbn.get(isbn)
+        if book is None:
+            return json_response({"error": "Book not found"}, status=404)
+        return json_response(
+            [
+                {
+                    "ratingId": book["bookId"] * 10 + n,
+                    "userId": n,
+                    "rating": (book["bookId"] + n) % 5 + 1,
+                    "ratedAt": "2024-01-01T00:00:00.000+00:00",
+                }
+                for n in range(3)
+            ]
+        )
+
+    def approved_reviews(self, request, isbn):
+        if denied := self.forbidden(request):
+            return denied
+        return json_response(
+            [
+                review
+                for review in self.reviews_by_isbn.get(isbn, [])
+                if review["status"] == "APPROVED"
+            ]
+        )
+
+    def moderate_book(self, request, action, book_id):
+        if denied := self.forbidden(request):
+            return denied
+        book = self.by_id.get(int(book_id))
+        if book is None:
+            return json_response({"error": "Book not found"}, status=404)
+        status = "APPROVED" if action == "approve" else "REJECTED"
+        return json_response(dict(book, status=status))
+
+    def moderate_review(self, request, action, review_id):
+        if denied := self.forbidden(request):
+            return denied
+        review = self.review_by_id.get(int(review_id))
+        if review is None:
+            return json_response({"error": "Review not found"}, status=404)
+        status = "APPROVED" if action == "approve" else "REJECTED"
+        return json_response(dict(review, status=status))
+
+    def add(self, request):
+        if denied := self.forbidden(request):
+            return denied
+        return json_response(
+            dict(request.get_json(silent=True) or {}, status="PENDING")
+        )
+
+    def delete(self, kind):
+        def handler(request, item_id):
+            if denied := self.forbidden(request):
+                return denied
+            return Response(f"Deleted {kind} with ID {item_id}", 200)
+
+        return handler
+
+
+def isbn_of(book_id):
+    return f"978{book_id:010d}"
+
+
+def is_pending_book(book_id, pending_ratio):
+    """Whether the synthetic catalogue has ``book_id`` waiting for moderation."""
+    if not pending_ratio:
+        return False
+    return book_id % max(1, round(1 / pending_ratio)) == 0
+
+
+def serve(wsgi_app, host="127.0.0.1", port=0):
+    """Serve ``wsgi_app`` from a background thread; returns the server."""
+    server = make_server(host, port, wsgi_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,146 @@
+"""Latency statistics, JSON results and comparison between runs."""
+
+import json
+import math
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, errors, duration):
+    """Summary of one group of samples; latencies in seconds, output in ms."""
+    latencies = sorted(latencies)
+    count = len(latencies)
+    summary = {
+        "requests": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "rps": round(count / duration, 2) if duration else 0.0,
+    }
+    if count:
+        summary["latency_ms"] = {
+            f"p{pct}": round(percentile(latencies, pct) * 1000, 3)
+            for pct in PERCENTILES
+        }
+        summary["latency_ms"]["mean"] = round(sum(latencies) / count * 1000, 3)
+        summary["latency_ms"]["max"] = round(latencies[-1] * 1000, 3)
+    return summary
+
+
+def build_results(samples, duration, meta):
+    """Group samples into totals, per-scenario and per-step summaries.
+
+    ``samples`` are ``(scenario, step, latency, ok, status)`` tuples.
+    """
+    groups = {"steps": {}, "scenarios": {}}
+    statuses = {}
+    all_latencies = []
+    all_errors = 0
+    for scenario, step, latency, ok, status in samples:
+        for kind, name in (("steps", step), ("scenarios", scenario)):
+            latencies, errors = groups[kind].setdefault(name, ([], [0]))
+            latencies.append(latency)
+            errors[0] += not ok
+        all_latencies.append(latency)
+        all_errors += not ok
+        key = f"{step} {status}"
+        statuses[key] = statuses.get(key, 0) + 1
+
+    return {
+        "meta": meta,
+        "total": summarize(all_latencies, all_errors, duration),
+        "scenarios": {
+            name: summarize(latencies, errors[0], duration)
+            for name, (latencies, errors) in sorted(groups["scenarios"].items())
+        },
+        "steps": {
+            name: summarize(latencies, errors[0], duration)
+            for name, (latencies, errors) in sorted(groups["steps"].items())
+        },
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+def save_results(results, path):
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def load_results(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def format_table(results):
+    rows = [("", "requests", "rps", "errors", "p50 ms", "p95 ms", "p99 ms")]
+    entries = [("total", results["total"])]
+    entries += [(f"  {name}", summary) for name, summary in results["steps"].items()]
+    for name, summary in entries:
+        latency = summary.get("latency_ms", {})
+        rows.append(
+            (
+                name,
+                str(summary["requests"]),
+                f"{summary['rps']:.1f}",
+                str(summary["errors"]),
+                *(f"{latency.get(f'p{pct}', 0):.1f}" for pct in PERCENTILES),
+            )
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(
+            cell.ljust(width) if i == 0 else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(row, widths))
+        )
+        for row in rows
+    )
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """Compare two result files step by step.
+
+    Returns ``(lines, regressions)``: a printable report and the entries
+    whose p95 latency grew, or whose throughput dropped, by more than
+    ``threshold`` (a fraction), or whose error rate went up.
+    """
+    lines = []
+    regressions = []
+    entries = [("total", baseline["total"], current["total"])]
+    entries += [
+        (name, baseline["steps"][name], summary)
+        for name, summary in current["steps"].items()
+        if name in baseline["steps"]
+    ]
+    for name, before, after in entries:
+        p95_before = before.get("latency_ms", {}).get("p95")
+        p95_after = after.get("latency_ms", {}).get("p95")
+        problems = []
+        if p95_before and p95_after and p95_after > p95_before * (1 + threshold):
+            problems.append("p95")
+        if name == "total" and after["rps"] < before["rps"] * (1 - threshold):
+            problems.append("rps")
+        if after["error_rate"] > before["error_rate"]:
+            problems.append("errors")
+        if problems:
+            regressions.append((name, problems))
+        lines.append(
+            f"{'REGRESSION ' if problems else ''}{name}: "
+            f"p95 {p95_before} -> {p95_after} ms ({relative_change(p95_before, p95_after)}), "
+            f"rps {before['rps']} -> {after['rps']} ({relative_change(before['rps'], after['rps'])}), "
+            f"errors {before['error_rate']:.2%} -> {after['error_rate']:.2%}"
+        )
+    return lines, regressions
+
+
+def relative_change(before, after):
+    if not before or after is None:
+        return "n/a"
+    return f"{(after - before) / before:+.1%}"
@@ -0,0 +1,212 @@
+"""Starts the fakes and the webserver, then drives virtual users against it.
+
+The fakes and the webserver each run in their own process, so neither the
+stand-ins nor the load generator compete with the webserver for the GIL.
+"""
+
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import requests
+from ..metadata import WEBSERVER_DIR
+from .fakes import FakeBooksService, FakeKeycloak, FaultInjector, serve
+from .scenarios import SCENARIOS, VirtualUser
+
+SERVERS = ("werkzeug", "gunicorn", "uvicorn")
+
+
+class Recorder:
+    """Collects ``(scenario, step, latency, ok, status)`` samples while recording.
+
+    Virtual users record from many threads; ``list.append`` is atomic, so no
+    lock is needed. Samples taken during warm-up are discarded.
+    """
+
+    def __init__(self):
+        self.samples = []
+        self.recording = False
+
+    def record(self, scenario, step, latency, ok, status):
+        if self.recording:
+            self.samples.append((scenario, step, latency, ok, status))
+
+
+def run_fakes(settings, ready):
+    """Child process: serve both fakes and report their base URLs."""
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    keycloak = FakeKeycloak(
+        token_ttl=settings["token_ttl"],
+        faults=FaultInjector(
+            settings["keycloak_latency"],
+            settings["keycloak_jitter"],
+            settings["keycloak_error_rate"],
+        ),
+    )
+    books = FakeBooksService(
+        book_count=settings["books"],
+        reviews_per_book=settings["reviews_per_book"],
+        pending_ratio=settings["pending_ratio"],
+        faults=FaultInjector(
+            settings["books_latency"],
+            settings["books_jitter"],
+            settings["books_error_rate"],
+        ),
+    )
+    servers = [serve(keycloak), serve(books)]
+    ready.put([f"http://127.0.0.1:{server.server_port}" for server in servers])
+    threading.Event().wait()
+
+
+def run_werkzeug_app(env, ready):
+    """Child process: build the app with ``create_app()`` and serve it threaded."""
+    os.environ.update(env)
+    sys.path.insert(0, WEBSERVER_DIR)
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    app = create_app()
+    app.secret_key = "benchmark"
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    ready.put(f"http://127.0.0.1:{server.server_port}")
+    server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{url}/teapot", timeout=1)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"Webserver did not come up at {url}")
+
+
+class Stack:
+    """The fakes plus the webserver under test, started and stopped together."""
+
+    def __init__(self, settings, server="werkzeug", threads=16, env=None):
+        self.settings = settings
+        self.server = server
+        self.threads = threads
+        self.env = dict(env or {})
+        self._processes = []
+        self.app_url = None
+
+    def __enter__(self):
+        context = multiprocessing.get_context("spawn")
+        ready = context.Queue()
+        fakes = context.Process(
+            target=run_fakes, args=(self.settings, ready), daemon=True
+        )
+        fakes.start()
+        self._processes.append(fakes)
+        keycloak_url, books_url = ready.get(timeout=30)
+
+        env = {
+            "KEYCLOAK_URL": keycloak_url,
+            "BOOKS_SERVICE_URL": books_url,
+            "LOG_LEVEL": "WARNING",
+            # The development server logs every request at INFO.
+            "LOG_LEVELS": "urllib3=WARNING,werkzeug=WARNING",
+        }
+        env.update(self.env)
+        if self.server == "werkzeug":
+            app = context.Process(
+                target=run_werkzeug_app, args=(env, ready), daemon=True
+            )
+            app.start()
+            self._processes.append(app)
+            self.app_url = ready.get(timeout=30)
+        else:
+            port = free_port()
+            if self.server == "gunicorn":
+                command = [
+                    "gunicorn",
+                    "-w",
+                    "1",
+                    "--threads",
+                    str(self.threads),
+                    "--bind",
+                    f"127.0.0.1:{port}",
+                    "manage:app",
+                ]
+            else:
+                env["ASYNC_MODE"] = "true"
+                command = [
+                    "uvicorn",
+                    "asgi:app",
+                    "--host",
+                    "127.0.0.1",
+                    "--port",
+                    str(port),
+                    "--log-level",
+                    "warning",
+                ]
+            self._processes.append(
+                subprocess.Popen(command, cwd=WEBSERVER_DIR, env={**os.environ, **env})
+            )
+            self.app_url = f"http://127.0.0.1:{port}"
+        wait_until_ready(self.app_url)
+        return self
+
+    def __exit__(self, *exc_info):
+        for process in reversed(self._processes):
+            process.terminate()
+        for process in reversed(self._processes):
+            if isinstance(process, subprocess.Popen):
+                process.wait(timeout=10)
+            else:
+                process.join(timeout=10)
+
+
+def run_load(base_url, mix, catalogue, users=16, duration=30, warmup=5, seed=1):
+    """Run ``users`` closed-loop virtual users picking scenarios from ``mix``.
+
+    Returns the samples recorded after ``warmup`` seconds and the length of
+    the measured window in seconds.
+    """
+    recorder = Recorder()
+    stop = threading.Event()
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    def virtual_user(number):
+        rng = random.Random(seed * 1000 + number)
+        user = VirtualUser(base_url, number, catalogue, rng, recorder)
+        while not stop.is_set():
+            name = rng.choices(names, weights)[0]
+            user.scenario = name
+            try:
+                SCENARIOS[name](user)
+            except Exception as e:
+                recorder.record(name, "scenario error", 0.0, False, type(e).__name__)
+
+    threads = [
+        threading.Thread(target=virtual_user, args=(number,), daemon=True)
+        for number in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup)
+    recorder.recording = True
+    started = time.perf_counter()
+    time.sleep(duration)
+    recorder.recording = False
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=30)
+    return recorder.samples, elapsed
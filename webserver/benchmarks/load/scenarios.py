@@ -0,0 +1,156 @@
+"""User journeys driven by the load runner.
+
+A scenario is a function of a ``VirtualUser``; every request it makes is
+timed under a step name that groups requests by route, not by URL.
+"""
+
+import time
+import requests
+from .fakes import isbn_of, is_pending_book
+
+
+class Catalogue:
+    """What the virtual users know about the fake books service's data."""
+
+    def __init__(self, book_count, pending_ratio):
+        self.book_ids = range(1, book_count + 1)
+        self.approved_isbns = [
+            isbn_of(book_id)
+            for book_id in self.book_ids
+            if not is_pending_book(book_id, pending_ratio)
+        ]
+
+
+class VirtualUser:
+    """One simulated browser: a cookie jar per account and a sample recorder."""
+
+    def __init__(self, base_url, number, catalogue, rng, recorder, timeout=10):
+        self.base_url = base_url
+        self.number = number
+        self.catalogue = catalogue
+        self.rng = rng
+        self.recorder = recorder
+        self.timeout = timeout
+        self.scenario = None
+        self._sessions = {}
+
+    def session(self, account):
+        """The logged-in session for ``account``, logging in on first use."""
+        http = self._sessions.get(account)
+        if http is None:
+            http = self._sessions[account] = requests.Session()
+            self.login(http, account)
+        return http
+
+    def forget(self, account):
+        http = self._sessions.pop(account, None)
+        if http is not None:
+            http.close()
+
+    def login(self, http, account):
+        return self.request(
+            http,
+            "POST /login",
+            "POST",
+            "/login",
+            data={"username": f"{account}{self.number}", "password": "secret"},
+        )
+
+    def request(self, http, step, method, path, expect=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = http.request(
+                method,
+                self.base_url + path,
+                timeout=self.timeout,
+                allow_redirects=False,
+                **kwargs,
+            )
+            status = response.status_code
+            ok = status in expect
+        except requests.exceptions.RequestException as e:
+            response = None
+            status = type(e).__name__
+            ok = False
+        self.recorder.record(
+            self.scenario, step, time.perf_counter() - started, ok, status
+        )
+        return response
+
+
+def login(user):
+    """Log in, open the dashboard and log out again."""
+    http = requests.Session()
+    try:
+        user.login(http, "reader")
+        user.request(http, "GET /dashboard", "GET", "/dashboard")
+        user.request(http, "POST /logout", "POST", "/logout")
+    finally:
+        http.close()
+
+
+def dashboard(user):
+    """Open the dashboard, which loads the approved books list."""
+    http = user.session("reader")
+    user.request(http, "GET /dashboard", "GET", "/dashboard")
+    user.request(http, "GET /books", "GET", "/books")
+
+
+def book_page(user):
+    """Open one book's page and load its details, reviews and ratings."""
+    http = user.session("reader")
+    isbn = user.rng.choice(user.catalogue.approved_isbns)
+    user.request(http, "GET /books/<isbn>", "GET", f"/books/{isbn}")
+    user.request(http, "GET /books/<isbn>/bundle", "GET", f"/books/{isbn}/bundle")
+
+
+def moderation(user):
+    """Open the moderation page, list the queues and approve or reject one book."""
+    http = user.session("moderator")
+    user.request(http, "GET /requests", "GET", "/requests")
+    response = user.request(
+        http, "GET /requests/books/pending", "GET", "/requests/books/pending"
+    )
+    user.request(
+        http, "GET /requests/reviews/pending", "GET", "/requests/reviews/pending"
+    )
+    if response is None or response.status_code != 200:
+        return
+    pending = response.json()
+    if pending:
+        book = user.rng.choice(pending)
+        action = user.rng.choice(("approve", "reject"))
+        user.request(
+            http,
+            f"GET /requests/books/{action}/<id>",
+            "GET",
+            f"/requests/books/{action}/{book['bookId']}",
+        )
+
+
+SCENARIOS = {
+    "login": login,
+    "dashboard": dashboard,
+    "book_page": book_page,
+    "moderation": moderation,
+}
+
+DEFAULT_MIX = "login=1,dashboard=4,book_page=4,moderation=1"
+
+
+def parse_mix(spec):
+    """Parse ``name=weight`` pairs into a scenario -> weight mapping."""
+    mix = {}
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        name, _, weight = entry.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(
+                f"Unknown scenario {name!r}, expected one of {', '.join(SCENARIOS)}."
+            )
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("The scenario mix needs at least one positive weight.")
+    return mix
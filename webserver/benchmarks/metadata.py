@@ -0,0 +1,51 @@
+"""Run metadata shared by the benchmark suites, so results can be told apart."""
+
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+WEBSERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def git_revision():
+    """Return ``(commit, dirty)`` for the webserver tree, or ``(None, None)``."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=WEBSERVER_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--", "."],
+                cwd=WEBSERVER_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def run_metadata(options):
+    commit, dirty = git_revision()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "options": options,
+    }
+
+
+def default_result_path(results_dir, commit):
+    os.makedirs(results_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(results_dir, f"{stamp}-{(commit or 'unknown')[:10]}.json")
@@ -0,0 +1,128 @@
+"""Command line entry point: ``python -m benchmarks.micro``.
+
+Run from the ``webserver`` directory.
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import sys
+from ..metadata import default_result_path, run_metadata
+from . import harness
+from .cases import CASES, DEFAULT_SIZES, Cases
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def parse_sizes(value):
+    try:
+        sizes = [int(size) for size in value.split(",") if size.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Expected comma-separated sizes, got {value!r}"
+        )
+    if not sizes or min(sizes) < 1:
+        raise argparse.ArgumentTypeError("Sizes must be positive integers.")
+    return sizes
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.micro")
+    parser.add_argument(
+        "--sizes",
+        type=parse_sizes,
+        default=list(DEFAULT_SIZES),
+        help="Dataset sizes, comma-separated (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--case",
+        action="append",
+        default=[],
+        metavar="PATTERN",
+        help="Only run cases whose name matches this glob; repeatable.",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case.")
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="Seconds each timed run should last at least.",
+    )
+    parser.add_argument(
+        "--output",
+        help="Where to write the JSON results (default: results/<time>-<commit>.json).",
+    )
+    parser.add_argument(
+        "--baseline",
+        default=BASELINE,
+        help="Result file to compare against (default: benchmarks/micro/baseline.json).",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Also write the results to the baseline file instead of comparing.",
+    )
+    parser.add_argument("--threshold", type=float, default=0.2)
+    return parser
+
+
+def selected_cases(patterns, sizes):
+    for name, sized in CASES.items():
+        if patterns and not any(fnmatch.fnmatch(name, p) for p in patterns):
+            continue
+        for size in sizes if sized else [None]:
+            yield name, size
+
+
+def save(results, path):
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    cases = Cases()
+    results = {
+        "meta": run_metadata(
+            {
+                "sizes": args.sizes,
+                "cases": args.case,
+                "repeat": args.repeat,
+                "min_time": args.min_time,
+            }
+        ),
+        "cases": {},
+    }
+    for name, size in selected_cases(args.case, args.sizes):
+        label = name if size is None else f"{name}[{size}]"
+        print(f"{label}...", file=sys.stderr)
+        func = getattr(cases, name)(size)
+        results["cases"][label] = harness.measure(func, args.repeat, args.min_time)
+    print(harness.format_table(results))
+
+    output = args.output or default_result_path(RESULTS_DIR, results["meta"]["commit"])
+    save(results, output)
+    print(f"Results written to {output}")
+
+    if args.save_baseline:
+        save(results, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to store one.")
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    lines, regressions = harness.compare_results(baseline, results, args.threshold)
+    print("\n".join(lines))
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""The functions under test, each wrapped as a zero-argument callable.
+
+Datasets come from the load-test fakes, so they have the same shape as the
+books service responses. Cases marked ``sized`` are run once per dataset
+size; the others work on a single session and run once.
+"""
+
+import os
+import secrets
+from functools import partial
+
+# The settings module reads these at import time; nothing is contacted.
+os.environ.setdefault("KEYCLOAK_URL", "http://127.0.0.1:9")
+os.environ.setdefault("BOOKS_SERVICE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from flask.sessions import SecureCookieSessionInterface  # noqa: E402
+from app import create_app, json_provider  # noqa: E402
+from app.books_info_routes import transform_reviews  # noqa: E402
+from app.list_query import ListQuery  # noqa: E402
+from app.requests_routes import is_own_item  # noqa: E402
+from app.session_store import ServerSideSessionInterface  # noqa: E402
+from ..load.fakes import FakeBooksService  # noqa: E402
+
+DEFAULT_SIZES = (10, 1000, 100000)
+MODERATOR_ID = "kc-reader0"
+
+
+def make_books(size):
+    return [FakeBooksService.make_book(book_id) for book_id in range(1, size + 1)]
+
+
+def make_reviews(size):
+    books = make_books(max(1, size // 5))
+    return [
+        FakeBooksService.make_review(review_id, books[review_id % len(books)], 0)
+        for review_id in range(1, size + 1)
+    ]
+
+
+def make_pending_books(size):
+    # Pending books carry their submitter, which the moderator's own are filtered on.
+    books = make_books(size)
+    for book in books:
+        user_number = book["bookId"] * 7 % 50
+        book["status"] = "PENDING"
+        book["user"] = {
+            "username": f"reader{user_number}",
+            "keycloakId": f"kc-reader{user_number}",
+        }
+    return books
+
+
+def make_session():
+    # Keycloak access and refresh tokens are JWTs of roughly this size.
+    return {
+        "Authorization": secrets.token_urlsafe(900),
+        "refresh_token": secrets.token_urlsafe(600),
+        "username": "reader0",
+        "keycloak_user_id": MODERATOR_ID,
+        "role": "user-verified",
+        "_permanent": True,
+    }
+
+
+def filter_pending(items):
+    return ListQuery().apply(
+        items, exclude=lambda item: is_own_item(item, MODERATOR_ID)
+    )
+
+
+class Cases:
+    """Builds the app once and hands out the callables to measure."""
+
+    def __init__(self):
+        self.app = create_app()
+        self.app.secret_key = "benchmark"
+
+    def transform_reviews(self, size):
+        return partial(transform_reviews, make_reviews(size))
+
+    def pending_books_filter(self, size):
+        return partial(filter_pending, make_pending_books(size))
+
+    def pending_reviews_filter(self, size):
+        return partial(filter_pending, make_reviews(size))
+
+    def jsonify_books(self, size):
+        books = make_books(size)
+
+        def run():
+            with self.app.app_context():
+                return self.app.json.response(books).get_data()
+
+        return run
+
+    def json_loads_books(self, size):
+        body = self.app.json.dumps(make_books(size)).encode()
+        return partial(json_provider.loads, body)
+
+    def cookie_session_encode(self, size=None):
+        serializer = SecureCookieSessionInterface().get_signing_serializer(self.app)
+        return partial(serializer.dumps, make_session())
+
+    def cookie_session_decode(self, size=None):
+        serializer = SecureCookieSessionInterface().get_signing_serializer(self.app)
+        return partial(serializer.loads, serializer.dumps(make_session()))
+
+    def session_id_sign(self, size=None):
+        signer = ServerSideSessionInterface(None).get_signer(self.app)
+        return partial(signer.sign, secrets.token_urlsafe(32))
+
+    def session_id_unsign(self, size=None):
+        signer = ServerSideSessionInterface(None).get_signer(self.app)
+        return partial(signer.unsign, signer.sign(secrets.token_urlsafe(32)))
+
+
+# name -> whether the case runs once per dataset size
+CASES = {
+    "transform_reviews": True,
+    "pending_books_filter": True,
+    "pending_reviews_filter": True,
+    "jsonify_books": True,
+    "json_loads_books": True,
+    "cookie_session_encode": False,
+    "cookie_session_decode": False,
+    "session_id_sign": False,
+    "session_id_unsign": False,
+}
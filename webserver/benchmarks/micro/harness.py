@@ -0,0 +1,153 @@
+"""Timing and allocation measurements for single functions."""
+
+import gc
+import statistics
+import time
+import tracemalloc
+
+
+def calibrate(func, min_time):
+    """Smallest power-of-ten loop count whose run takes at least ``min_time``."""
+    loops = 1
+    while True:
+        started = time.perf_counter_ns()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter_ns() - started
+        if elapsed >= min_time * 1e9 or loops >= 10**7:
+            return loops
+        loops *= 10
+
+
+def time_per_op(func, repeat=5, min_time=0.2):
+    """Return ``(loops, [ns per op for each repeat])``.
+
+    The garbage collector is paused while timing, as ``timeit`` does, so a
+    collection triggered by an earlier case does not land in a later one.
+    """
+    loops = calibrate(func, min_time)
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter_ns()
+            for _ in range(loops):
+                func()
+            timings.append((time.perf_counter_ns() - started) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return loops, timings
+
+
+def allocations(func):
+    """Peak bytes allocated during one call, and bytes still held once it returns.
+
+    The result is dropped before the retained figure is read, so anything
+    left over is memory the call keeps alive elsewhere (caches, leaks).
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+        del result
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before, max(0, after - before)
+
+
+def measure(func, repeat=5, min_time=0.2):
+    loops, timings = time_per_op(func, repeat, min_time)
+    peak, retained = allocations(func)
+    return {
+        "loops": loops,
+        "repeat": repeat,
+        "ns_per_op": {
+            "min": round(min(timings), 1),
+            "median": round(statistics.median(timings), 1),
+        },
+        "peak_bytes": peak,
+        "retained_bytes": retained,
+    }
+
+
+def compare_results(baseline, current, threshold=0.2):
+    """Compare two result files case by case.
+
+    Returns ``(lines, regressions)``: a printable report and the cases whose
+    fastest time or peak allocation grew by more than ``threshold`` (a
+    fraction). Cases missing from either file are skipped.
+    """
+    lines = []
+    regressions = []
+    for name, after in current["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            lines.append(f"{name}: new case, no baseline")
+            continue
+        problems = []
+        time_before, time_after = before["ns_per_op"]["min"], after["ns_per_op"]["min"]
+        if time_after > time_before * (1 + threshold):
+            problems.append("time")
+        if after["peak_bytes"] > before["peak_bytes"] * (1 + threshold):
+            problems.append("memory")
+        if problems:
+            regressions.append((name, problems))
+        lines.append(
+            f"{'REGRESSION ' if problems else ''}{name}: "
+            f"{format_ns(time_before)} -> {format_ns(time_after)} "
+            f"({relative_change(time_before, time_after)}), "
+            f"peak {format_bytes(before['peak_bytes'])} -> "
+            f"{format_bytes(after['peak_bytes'])} "
+            f"({relative_change(before['peak_bytes'], after['peak_bytes'])})"
+        )
+    return lines, regressions
+
+
+def relative_change(before, after):
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before:+.1%}"
+
+
+def format_ns(ns):
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f} {unit}"
+    return f"{ns:.0f} ns"
+
+
+def format_bytes(size):
+    for unit, scale in (("MiB", 1 << 20), ("KiB", 1 << 10)):
+        if size >= scale:
+            return f"{size / scale:.1f} {unit}"
+    return f"{size} B"
+
+
+def format_table(results):
+    rows = [("", "loops", "min/op", "median/op", "peak", "retained")]
+    for name, case in results["cases"].items():
+        rows.append(
+            (
+                name,
+                str(case["loops"]),
+                format_ns(case["ns_per_op"]["min"]),
+                format_ns(case["ns_per_op"]["median"]),
+                format_bytes(case["peak_bytes"]),
+                format_bytes(case["retained_bytes"]),
+            )
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(
+            cell.ljust(width) if i == 0 else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(row, widths))
+        )
+        for row in rows
+    )
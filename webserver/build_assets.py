@@ -0,0 +1,111 @@
+"""Fingerprint and precompress the static assets: ``python build_assets.py``.
+
+Every file under ``app/static`` is copied to ``app/static/dist`` with a
+content hash in its name, next to ``.gz`` and ``.br`` variants for text
+assets, and ``dist/manifest.json`` maps the original names to the built
+ones. Brotli variants need the optional ``brotli`` package.
+
+The app is not imported, so this runs at image build time without any
+runtime configuration.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app", "static")
+# Must match app/assets.py.
+BUILD_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+COMPRESSIBLE = {".css", ".js", ".json", ".svg", ".html", ".txt", ".map"}
+
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def compressed_variants(data):
+    variants = {"gzip": (".gz", gzip.compress(data, compresslevel=9, mtime=0))}
+    if brotli is not None:
+        variants["br"] = (".br", brotli.compress(data, quality=11))
+    # A variant that saves nothing is not worth the extra request handling.
+    return {
+        encoding: (suffix, body)
+        for encoding, (suffix, body) in variants.items()
+        if len(body) < len(data)
+    }
+
+
+def source_files(static_dir):
+    for root, dirs, files in os.walk(static_dir):
+        if root == static_dir and BUILD_DIR in dirs:
+            dirs.remove(BUILD_DIR)
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, static_dir).replace(os.sep, "/"), path
+
+
+def build(static_dir):
+    build_dir = os.path.join(static_dir, BUILD_DIR)
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir)
+
+    manifest = {}
+    for filename, path in source_files(static_dir):
+        with open(path, "rb") as file:
+            data = file.read()
+        directory, name = os.path.split(filename)
+        stem, extension = os.path.splitext(name)
+        built = "/".join(
+            part
+            for part in (BUILD_DIR, directory, f"{stem}.{fingerprint(data)}{extension}")
+            if part
+        )
+        variants = compressed_variants(data) if extension in COMPRESSIBLE else {}
+
+        target = os.path.join(static_dir, *built.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as file:
+            file.write(data)
+        for suffix, body in variants.values():
+            with open(target + suffix, "wb") as file:
+                file.write(body)
+
+        manifest[filename] = {"path": built, "encodings": sorted(variants)}
+        print(
+            f"{filename} -> {built} ({len(data)} bytes"
+            + "".join(
+                f", {encoding} {len(body)}"
+                for encoding, (_, body) in sorted(variants.items())
+            )
+            + ")"
+        )
+
+    with open(os.path.join(build_dir, MANIFEST_NAME), "w") as file:
+        json.dump({"files": manifest}, file, indent=2, sort_keys=True)
+        file.write("\n")
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--static-dir", default=STATIC_DIR)
+    args = parser.parse_args(argv)
+    if brotli is None:
+        print("brotli is not installed, only gzip variants are built.")
+    build(args.static_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
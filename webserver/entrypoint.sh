@@ -1,4 +1,15 @@
 #!/bin/sh
 export FLASK_DEBUG=0
-gunicorn -w 1 --threads 4 --timeout 120 --bind 0.0.0.0:5000 manage:app
-exec "$@"
\ No newline at end of file
+if [ "$ASYNC_MODE" = "true" ]; then
+    # asgi.py runs requests on a pool of ASGI_THREADS threads, which bounds
+    # the requests in flight. Upstream I/O is multiplexed on one event loop,
+    # so waiting threads are cheap and the pool can be much larger than
+    # gunicorn's thread count.
+    export ASGI_THREADS="${ASGI_THREADS:-256}"
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --timeout-keep-alive 120
+else
+    # Each /requests/stream subscriber holds a thread; STREAM_MAX_SUBSCRIBERS
+    # defaults to a quarter of GUNICORN_THREADS.
+    gunicorn -w 1 --threads "${GUNICORN_THREADS:-16}" --timeout 120 --bind 0.0.0.0:5000 manage:app
+fi
+exec "$@"
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The settings module reads these at import time; nothing is contacted.
+os.environ.setdefault("KEYCLOAK_URL", "http://127.0.0.1:9")
+os.environ.setdefault("BOOKS_SERVICE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LOG_FORMAT", "text")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
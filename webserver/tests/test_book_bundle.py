@@ -0,0 +1,51 @@
+import pytest
+from app import create_app
+from app import routes_utils as utils
+from app.http_client import UpstreamBody
+
+JSON = "application/json"
+DETAILS = UpstreamBody(b'{"isbn": "1"}', JSON, 200)
+RATINGS = UpstreamBody(b"[]", JSON, 200)
+REVIEWS = UpstreamBody(b"[]", JSON, 200)
+NOT_FOUND = UpstreamBody(b'{"error": "not found"}', JSON, 404)
+
+
+@pytest.fixture
+def bundle(monkeypatch):
+    def get(parts):
+        monkeypatch.setattr(
+            utils, "fetch_authenticated_concurrently", lambda urls, cache_keys: parts
+        )
+        app = create_app()
+        app.secret_key = "test"
+        return app.test_client().get("/books/1/bundle")
+
+    return get
+
+
+@pytest.mark.parametrize(
+    "title, reviews",
+    [
+        (UpstreamBody(b"{}", JSON, 200), REVIEWS),
+        (UpstreamBody(b'"Title"', JSON, 200), REVIEWS),
+        (UpstreamBody(b'{"1": "Title"}', JSON, 200), UpstreamBody(b"[{}]", JSON, 200)),
+    ],
+)
+def test_malformed_part_is_reported_per_part(bundle, title, reviews):
+    response = bundle(
+        {"title": title, "details": DETAILS, "reviews": reviews, "ratings": RATINGS}
+    )
+
+    assert response.status_code == 200
+    statuses = {part: body["status"] for part, body in response.get_json().items()}
+    assert 502 in statuses.values()
+    assert statuses["details"] == 200
+
+
+def test_unknown_isbn_is_not_found(bundle):
+    response = bundle(
+        {part: NOT_FOUND for part in ("title", "details", "reviews", "ratings")}
+    )
+
+    assert response.status_code == 404
+    assert response.get_json()["title"]["status"] == 404
@@ -0,0 +1,33 @@
+from app.client_registry import ClientIdRegistry
+
+
+def make_registry(client_ids):
+    return ClientIdRegistry(lambda admin_token: client_ids.pop(0))
+
+
+def test_404_about_the_user_keeps_the_pinned_client_id():
+    registry = make_registry(["client-1", "client-1"])
+    assert registry.get("token") == "client-1"
+
+    registry.verify("token", "client-1")
+    assert registry.get("token") == "client-1"
+    assert registry.lookups == 2
+
+
+def test_recreated_client_replaces_the_pinned_id():
+    registry = make_registry(["client-1", "client-2"])
+    registry.get("token")
+
+    registry.verify("token", "client-1")
+    assert registry.get("token") == "client-2"
+    # A second caller that saw the old id does not look it up again.
+    registry.verify("token", "client-1")
+    assert registry.lookups == 2
+
+
+def test_failed_lookup_keeps_the_pinned_id():
+    registry = make_registry(["client-1", None])
+    registry.get("token")
+
+    registry.verify("token", "client-1")
+    assert registry.get("token") == "client-1"
@@ -0,0 +1,47 @@
+import pytest
+from flask import jsonify
+from app import create_app
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.secret_key = "test"
+
+    @app.route("/test/large")
+    def large():
+        return jsonify([{"id": i, "title": "A book title"} for i in range(500)])
+
+    return app.test_client()
+
+
+def test_compressed_body_has_its_own_etag(client):
+    identity = client.get("/test/large", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/test/large", headers={"Accept-Encoding": "gzip"})
+
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    etag = identity.get_etag()[0]
+    assert gzipped.get_etag() == (f"{etag}-gzip", False)
+
+
+def test_either_etag_form_revalidates(client):
+    etag = client.get("/test/large").get_etag()[0]
+
+    for sent in (etag, f"{etag}-gzip"):
+        response = client.get(
+            "/test/large",
+            headers={"Accept-Encoding": "gzip", "If-None-Match": f'"{sent}"'},
+        )
+        assert response.status_code == 304
+        assert response.get_etag() == (sent, False)
+
+
+def test_encoded_etag_does_not_match_another_encoding(client):
+    etag = client.get("/test/large").get_etag()[0]
+
+    response = client.get(
+        "/test/large",
+        headers={"Accept-Encoding": "identity", "If-None-Match": f'"{etag}-gzip"'},
+    )
+    assert response.status_code == 200
+    assert response.get_etag() == (etag, False)
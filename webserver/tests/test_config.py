@@ -0,0 +1,14 @@
+import pytest
+from app.config import parse_pairs
+
+
+def test_parse_pairs():
+    assert parse_pairs("X", " a = 1, ,b=2,", int) == {"a": 1, "b": 2}
+    assert parse_pairs("X", "urllib3=warning", str.upper) == {"urllib3": "WARNING"}
+    assert parse_pairs("X", "") == {}
+
+
+@pytest.mark.parametrize("spec", ["a", "a=", "=1", "a=1=2", "a=x"])
+def test_parse_pairs_rejects_malformed_entries(spec):
+    with pytest.raises(ValueError, match="^X: "):
+        parse_pairs("X", spec, int)
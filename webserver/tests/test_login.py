@@ -0,0 +1,45 @@
+import pytest
+from app import create_app
+from app import routes_utils as utils
+
+
+class FakeResponse:
+    status_code = 200
+
+    def json(self):
+        return {"access_token": "access", "refresh_token": "refresh"}
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(utils, "keycloak_request", lambda *a, **kw: FakeResponse())
+    monkeypatch.setattr(
+        utils, "resolve_login_identity", lambda token, username: ("user-1", None)
+    )
+    app = create_app()
+    app.secret_key = "test"
+    return app
+
+
+def login(app):
+    client = app.test_client()
+    response = client.post("/login", data={"username": "u", "password": "p"})
+    return client, response
+
+
+def test_login_without_roles_fails_cleanly(app):
+    client, response = login(app)
+
+    assert response.status_code == 502
+    assert response.get_json()["success"] is False
+    with client.session_transaction() as session:
+        assert "Authorization" not in session
+
+
+def test_login_without_roles_uses_cached_roles(app):
+    app.extensions["role_cache"].put("user-1", ["user", "verified"])
+    client, response = login(app)
+
+    assert response.status_code == 200
+    with client.session_transaction() as session:
+        assert session["role"] == "user-verified"
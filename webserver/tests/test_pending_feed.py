@@ -0,0 +1,78 @@
+import time
+import pytest
+from app.pending_feed import PendingFeed
+from app.routes_utils import NoPermissionError
+
+
+class FakeBooksService:
+    """Pending lists as seen by each role; tokens are named after their role."""
+
+    def __init__(self):
+        self.pending = {
+            "admin": {"books": [{"bookId": 1}, {"bookId": 2}], "reviews": []},
+            "moderator": {"books": [{"bookId": 1}], "reviews": []},
+        }
+        self.tokens_used = []
+
+    def fetch(self, target, access_token, scope):
+        self.tokens_used.append(access_token)
+        role = access_token.removesuffix("-token")
+        if role not in self.pending:
+            raise NoPermissionError
+        return list(self.pending[role][target])
+
+
+def wait_for_polls(feed, polls, timeout=2):
+    deadline = time.monotonic() + timeout
+    while feed.polls < polls and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def service():
+    return FakeBooksService()
+
+
+@pytest.fixture
+def feed(service):
+    feed = PendingFeed(
+        service.fetch, {"books": "bookId", "reviews": "reviewId"}, interval=60
+    )
+    yield feed
+    feed._subscribers.clear()
+    feed.notify()
+
+
+def test_snapshot_then_delta(service, feed):
+    subscriber, snapshot = feed.subscribe("admin-token", "admin")
+    assert snapshot == {"books": [{"bookId": 1}, {"bookId": 2}], "reviews": []}
+
+    service.pending["admin"]["books"] = [{"bookId": 2}, {"bookId": 3}]
+    feed.notify()
+
+    assert subscriber.next_event(timeout=2) == {
+        "target": "books",
+        "added": [{"bookId": 3}],
+        "removed": [1],
+    }
+
+
+def test_each_scope_is_polled_with_its_own_token(service, feed):
+    admin, _ = feed.subscribe("admin-token", "admin")
+    moderator, snapshot = feed.subscribe("moderator-token", "moderator")
+    assert snapshot["books"] == [{"bookId": 1}]
+
+    service.pending["admin"]["books"].append({"bookId": 3})
+    service.tokens_used.clear()
+    feed.notify()
+    wait_for_polls(feed, 2)
+
+    assert admin.next_event(timeout=2)["added"] == [{"bookId": 3}]
+    assert moderator.events.empty()
+    assert sorted(set(service.tokens_used)) == ["admin-token", "moderator-token"]
+
+
+def test_refused_token_gets_no_stream(feed):
+    with pytest.raises(NoPermissionError):
+        feed.subscribe("user-token", "user")
+    assert feed.stats()["subscribers"] == 0
@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+import requests
+from app.async_http import AsyncUpstreamClient
+from app.http_client import UpstreamHttpClient
+from app.resilience import CircuitBreaker, CircuitOpenError, RetryBudget, UpstreamGuard
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def make_client(statuses, failure_threshold=2, reset_timeout=60):
+    guard = UpstreamGuard(
+        CircuitBreaker("books", failure_threshold, reset_timeout=reset_timeout),
+        RetryBudget(ratio=1, min_per_second=100),
+        max_retries=2,
+        backoff_base=0,
+    )
+    client = UpstreamHttpClient()
+    client.register("books", pool_size=1, timeout=1, guard=guard)
+    calls = []
+
+    def send(name, method, url, **kwargs):
+        calls.append(url)
+        status = statuses.pop(0)
+        if status is None:
+            raise requests.exceptions.ConnectionError("down")
+        return FakeResponse(status)
+
+    client._send = send
+    return client, guard, calls
+
+
+def test_retried_call_counts_as_one_breaker_failure():
+    client, guard, calls = make_client([503, 503, 503])
+
+    assert client.request("books", "GET", "http://books/a").status_code == 503
+    assert len(calls) == 3
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retry_that_succeeds_records_no_failure():
+    client, guard, calls = make_client([None, 503, 200, 503, 503, 503])
+
+    assert client.request("books", "GET", "http://books/a").status_code == 200
+    assert client.request("books", "GET", "http://books/b").status_code == 503
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_opens_after_threshold_of_failed_calls():
+    client, guard, calls = make_client([None] * 6)
+
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.request("books", "GET", "http://books/a")
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        client.request("books", "GET", "http://books/a")
+    assert len(calls) == 6
+
+
+def test_call_without_retry_is_sent_once():
+    client, guard, calls = make_client([503, None])
+
+    response = client.request("books", "GET", "http://books/approve/1", retry=False)
+    assert response.status_code == 503
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.request("books", "GET", "http://books/approve/1", retry=False)
+    assert len(calls) == 2
+
+
+def test_probe_ending_in_unexpected_error_is_released():
+    client, guard, calls = make_client([None] * 9, reset_timeout=0)
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.request("books", "GET", "http://books/a")
+
+    def broken_send(name, method, url, **kwargs):
+        raise ValueError("bug")
+
+    send, client._send = client._send, broken_send
+    with pytest.raises(ValueError):
+        client.request("books", "GET", "http://books/a")
+    assert guard.breaker.state == CircuitBreaker.OPEN
+
+    # The next call is let through as a fresh probe instead of being rejected.
+    client._send = send
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.request("books", "GET", "http://books/a")
+    assert guard.breaker.rejected == 0
+
+
+def test_cancelled_async_probe_is_released():
+    guard = UpstreamGuard(
+        CircuitBreaker("books", failure_threshold=1, reset_timeout=0),
+        RetryBudget(ratio=1, min_per_second=100),
+        backoff_base=0,
+    )
+    guard.record(error=requests.exceptions.ConnectionError("down"))
+    client = AsyncUpstreamClient()
+    client._guards["books"] = guard
+
+    async def cancelled_send(name, method, url, **kwargs):
+        raise asyncio.CancelledError
+
+    client._send = cancelled_send
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(client.request("books", "GET", "http://books/a"))
+    assert guard.breaker.allow()
@@ -0,0 +1,108 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask
+from app import create_app
+from app import routes_utils as utils
+from app.http_client import UpstreamBody
+from app.response_cache import LruCacheBackend, ResponseCache
+
+
+def make_cache(ttl=60, stale_ttl=60):
+    return ResponseCache(
+        Flask(__name__),
+        LruCacheBackend(100),
+        {"book_title": ttl},
+        stale_ttl=stale_ttl,
+        refresh_workers=1,
+    )
+
+
+def body(text):
+    return UpstreamBody(text.encode(), "application/json", 200)
+
+
+def test_load_that_races_an_invalidation_is_not_stored():
+    cache = make_cache()
+
+    def load_then_write():
+        # The write lands while the old value is on its way back.
+        cache.invalidate("book_title", "1")
+        return body('"old"')
+
+    value, etag = cache.get_or_load("book_title", "1", "user", load_then_write)
+    assert value == body('"old"')
+    assert etag is None
+
+    value, _ = cache.get_or_load("book_title", "1", "user", lambda: body('"new"'))
+    assert value == body('"new"')
+
+
+def test_route_invalidation_discards_refresh_in_flight():
+    cache = make_cache(ttl=0)
+    cache.get_or_load("book_title", "1", "user", lambda: body('"old"'))
+
+    def load_then_write():
+        cache.invalidate("book_title")
+        return body('"old"')
+
+    value, _, state = cache.lookup("book_title", "1", "user", load_then_write)
+    assert state == cache.STALE
+    cache._executor.shutdown(wait=True)
+    assert cache.backend.get(cache.make_key("book_title", "1", "user")) is None
+
+
+def test_other_keys_are_still_stored():
+    cache = make_cache()
+    cache.invalidate("book_title", "2")
+
+    _, etag = cache.get_or_load("book_title", "1", "user", lambda: body('"one"'))
+    assert etag is not None
+
+
+class FakeUpstreamResponse:
+    status_code = 200
+    headers = {"Content-Type": "application/json"}
+
+    def __init__(self, content):
+        self.content = content
+
+
+def test_load_after_invalidation_does_not_join_earlier_flight(monkeypatch):
+    app = create_app()
+    app.secret_key = "test"
+    cache = app.extensions["response_cache"]
+    first_call_started = threading.Event()
+    release_first_call = threading.Event()
+    upstream = ['"old"', '"new"']
+
+    def books_service_request(method, url, **kwargs):
+        content = upstream.pop(0).encode()
+        if content == b'"old"':
+            first_call_started.set()
+            release_first_call.wait(5)
+        return FakeUpstreamResponse(content)
+
+    monkeypatch.setattr(utils, "books_service_request", books_service_request)
+
+    def get_title():
+        with app.test_request_context():
+            return utils.make_cached_get_request("book_title", "1", "http://books/1")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        before_write = executor.submit(get_title)
+        first_call_started.wait(5)
+        # The book is renamed while the first read is still in flight.
+        with app.app_context():
+            utils.invalidate_cached_responses("book_title", "1")
+        after_write = executor.submit(get_title)
+        time.sleep(0.05)
+        release_first_call.set()
+        assert before_write.result().content == b'"old"'
+        assert after_write.result().content == b'"new"'
+
+    with app.test_request_context():
+        assert (
+            utils.make_cached_get_request("book_title", "1", "http://books/1").content
+            == b'"new"'
+        )
@@ -0,0 +1,26 @@
+from flask import Flask
+from app.role_cache import RoleCache
+
+
+def test_roles_are_not_served_past_the_stale_window(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.role_cache.time.monotonic", lambda: clock[0])
+    loads = []
+
+    def keycloak_down(user_id):
+        loads.append(user_id)
+        return None
+
+    cache = RoleCache(
+        Flask(__name__), keycloak_down, ttl=30, stale_ttl=15, max_entries=10
+    )
+    cache.put("user-1", ["admin"])
+
+    clock[0] += 44
+    assert cache.get("user-1") == ["admin"]
+    assert cache.peek("user-1") == ["admin"]
+
+    clock[0] += 1
+    assert cache.get("user-1") is None
+    assert cache.peek("user-1") is None
+    assert "user-1" in loads
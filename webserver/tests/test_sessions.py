@@ -0,0 +1,30 @@
+import pytest
+from app import create_app
+from app.config import Config
+
+
+@pytest.fixture(params=["memory", "cookie"])
+def client(request, monkeypatch):
+    monkeypatch.setattr(Config, "SESSION_TYPE", request.param)
+    app = create_app()
+    app.secret_key = "test"
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["Authorization"] = "token"
+        session.permanent = True
+    return client
+
+
+def test_static_asset_leaves_session_alone(client):
+    response = client.get("/static/tailwind/tailwind.css")
+
+    assert response.status_code == 200
+    assert "Set-Cookie" not in response.headers
+    assert "Cookie" not in response.vary
+
+
+def test_pages_still_refresh_the_session(client):
+    response = client.get("/teapot")
+
+    assert "Set-Cookie" in response.headers
+    assert "Cookie" in response.vary
@@ -0,0 +1,137 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import jwt
+import pytest
+import requests
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+from app import create_app
+from app import routes_utils as utils
+from app.jwt_verifier import JwksCache, TokenVerifier
+
+ISSUER = "http://keycloak.test/realms/Istio"
+
+
+class FakeResponse:
+    def __init__(self, payload=None, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code}")
+
+    def json(self):
+        return self.payload
+
+
+class FakeJwksEndpoint:
+    def __init__(self):
+        self.keys = []
+        self.down = False
+        self.requests = 0
+
+    def add_key(self, kid):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+        self.keys.append(dict(jwk, kid=kid, alg="RS256", use="sig"))
+        return private_key
+
+    def request(self, upstream, method, url, **kwargs):
+        self.requests += 1
+        if self.down:
+            return FakeResponse(status_code=503)
+        return FakeResponse({"keys": list(self.keys)})
+
+
+def issue_token(private_key, kid, roles=("user",)):
+    now = int(time.time())
+    claims = {
+        "sub": "user-1",
+        "iss": ISSUER,
+        "azp": "Istio",
+        "iat": now,
+        "exp": now + 300,
+        "resource_access": {"Istio": {"roles": list(roles)}},
+    }
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def endpoint():
+    return FakeJwksEndpoint()
+
+
+@pytest.fixture
+def verifier(endpoint):
+    return TokenVerifier(
+        JwksCache(endpoint, "http://keycloak.test/certs", min_refetch_interval=30),
+        issuer=ISSUER,
+        client_id="Istio",
+    )
+
+
+def test_rotated_key_within_refetch_interval_falls_back(endpoint, verifier):
+    old_key = endpoint.add_key("old")
+    assert verifier.roles(verifier.verify(issue_token(old_key, "old"))) == ["user"]
+
+    # Keycloak rotates its key right after our last fetch.
+    new_key = endpoint.add_key("new")
+    token = issue_token(new_key, "new", roles=("user", "verified"))
+
+    app = create_app()
+    app.extensions["token_verifier"] = verifier
+    with app.app_context():
+        assert utils.get_token_roles(token) is None
+
+
+def test_jwks_outage_is_rate_limited(endpoint, verifier, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.jwt_verifier.time.monotonic", lambda: clock[0])
+    key = endpoint.add_key("old")
+    verifier.verify(issue_token(key, "old"))
+    endpoint.down = True
+    clock[0] += 60
+    fetched = endpoint.requests
+
+    for kid in ("a", "b", "c", "d", "e"):
+        with pytest.raises(jwt.InvalidKeyError):
+            verifier.jwks.get_signing_key(kid)
+    assert endpoint.requests - fetched == 1
+
+    clock[0] += 31
+    with pytest.raises(jwt.InvalidKeyError):
+        verifier.jwks.get_signing_key("f")
+    assert endpoint.requests - fetched == 2
+
+    # The keys fetched before the outage keep working.
+    assert verifier.roles(verifier.verify(issue_token(key, "old"))) == ["user"]
+
+
+def test_expired_key_set_is_kept_while_refetches_fail(endpoint):
+    key = endpoint.add_key("old")
+    jwks = JwksCache(endpoint, "http://keycloak.test/certs", lifespan=0)
+    assert jwks.get_signing_key("old")
+    endpoint.down = True
+    fetched = endpoint.requests
+
+    for _ in range(5):
+        assert jwks.get_signing_key("old")
+    assert endpoint.requests - fetched <= 1
+
+
+def test_concurrent_cold_start_waits_for_one_fetch(endpoint, verifier, monkeypatch):
+    key = endpoint.add_key("k1")
+    token = issue_token(key, "k1")
+    request = endpoint.request
+
+    def slow_request(*args, **kwargs):
+        time.sleep(0.05)
+        return request(*args, **kwargs)
+
+    monkeypatch.setattr(endpoint, "request", slow_request)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(verifier.verify, [token] * 8))
+
+    assert [verifier.roles(claims) for claims in results] == [["user"]] * 8
+    assert endpoint.requests == 1